@@ -1,19 +1,40 @@
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Dict, Optional, Set, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import threading
+import time
 import bcrypt
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-import pyotp
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 from dotenv import load_dotenv
 
-from database import get_db
+from database import async_read_session, get_async_db, pin_to_primary, replicas
+import metrics
 from models import User
 
 load_dotenv()
 
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# bcrypt work factor; hashes made with another cost are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Password hashing gets its own pool so login bursts cannot starve request threads
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hashing jobs allowed to wait for a worker before new ones are rejected with 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+# Verified tokens are cached per worker; other workers see user changes within the TTL
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -29,9 +50,46 @@ def get_password_hash(password):
     if isinstance(password, str):
         password = password.encode('utf-8')
     # bcrypt.hashpw returns bytes, we decode to store as string
-    return bcrypt.hashpw(password, bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash was made with a different work factor than BCRYPT_ROUNDS"""
+    # Format: $2b$<rounds>$<salt+hash>
+    parts = hashed_password.split("$")
+    return len(parts) < 4 or not parts[2].isdigit() or int(parts[2]) != BCRYPT_ROUNDS
+
+# bcrypt releases the GIL, so a thread pool gives real parallelism here
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
+
+async def _run_hashing(fn, *args):
+    """Run a bcrypt call on the hashing pool, failing fast when it is saturated"""
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_slots.release()
+
+def _timed(operation, fn):
+    def run(*args):
+        with metrics.PASSWORD_HASH_SECONDS.labels(operation).time():
+            return fn(*args)
+    return run
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_hashing(_timed("verify", verify_password), plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await _run_hashing(_timed("hash", get_password_hash), password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -41,31 +99,143 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+class _TokenCache:
+    """TTL-bounded LRU of verified tokens, keyed by token hash"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def put(self, key: str, user: User, token_exp: Optional[float]):
+        expires_at = time.monotonic() + self.ttl_seconds
+        if token_exp is not None:
+            # Never outlive the token itself
+            expires_at = min(expires_at, time.monotonic() + token_exp - time.time())
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (expires_at, user)
+            self._by_user.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry[1].id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry[1].id]
+
+
+_token_cache = _TokenCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES)
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str) -> dict:
+    # jose and its crypto backend load on the first authenticated request, not at import
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def invalidate_user(user_id: int):
+    """Drop cached tokens for a user after changing their record"""
+    _token_cache.invalidate_user(user_id)
+    # The next lookup must not read the old record from a replica
+    pin_to_primary(user_id)
+
+async def _find_user(payload: dict, db: AsyncSession) -> Optional[User]:
+    """Look the token's user up on a replica, or on the primary if the replica has not got the account yet"""
+    stmt = select(User).where(User.email == payload["sub"])
+    user_id = payload.get("uid")
+    async with async_read_session(user_id if isinstance(user_id, int) else None) as read_db:
+        user = (await read_db.scalars(stmt)).first()
+        if user is not None:
+            # Cached users are detached snapshots; re-fetch before modifying one
+            read_db.expunge(user)
+            return user
+    if not replicas:
+        return None
+    user = (await db.scalars(stmt)).first()
+    if user is not None:
+        db.expunge(user)
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    key = _token_key(token)
+    user = _token_cache.get(key)
+    if user is not None:
+        return user
+    payload = _decode_token(token)
+    user = await _find_user(payload, db)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    _token_cache.put(key, user, payload.get("exp"))
     return user
 
+async def get_current_user_id(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> int:
+    """Resolve the caller's user id, from the token alone when it carries one"""
+    user = _token_cache.get(_token_key(token))
+    if user is not None:
+        return user.id
+    payload = _decode_token(token)
+    user_id = payload.get("uid")
+    if isinstance(user_id, int):
+        return user_id
+    # Tokens issued before "uid" was added need a lookup
+    return (await get_current_user(token, db)).id
+
+# pyotp is only needed by the 2FA routes, so it is imported there
 def generate_totp_secret():
+    import pyotp
     return pyotp.random_base32()
 
 def verify_totp(secret: str, code: str):
+    import pyotp
     totp = pyotp.TOTP(secret)
     return totp.verify(code)
 
 def get_totp_uri(secret: str, email: str):
+    import pyotp
     totp = pyotp.TOTP(secret)
     return totp.provisioning_uri(name=email, issuer_name="PhonebookApp")
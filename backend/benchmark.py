@@ -0,0 +1,290 @@
+"""Backend benchmark suite.
+
+Runs the real FastAPI app in-process against a local database, seeds one user
+per address-book size and measures latency and throughput for search,
+pagination, single-contact CRUD and login. Results are written as JSON so runs
+from different commits can be compared:
+
+    python benchmark.py --sizes 1000,10000 --output before.json
+    python benchmark.py --sizes 1000,10000 --compare before.json
+
+DATABASE_URL selects the database; without it a SQLite file in the system temp
+directory is used. SECRET_KEY defaults to a fixed value, so no .env is needed.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), "phonebook_benchmark.db")
+# Tokens are issued and checked in this process only, so any key will do
+os.environ.setdefault("SECRET_KEY", "phonebook-benchmark")
+
+import httpx
+
+import crud
+import models
+import schemas
+from database import SessionLocal, engine
+from main import app
+
+PASSWORD = "benchmark-password"
+SEED = 1234
+SEED_BATCH_SIZE = 1000
+PAGE_SIZE = 20
+LARGE_PAGE_SIZE = 500
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def random_contact(rng, index):
+    first = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 8))).capitalize()
+    last = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))).capitalize()
+    return schemas.ContactCreate(
+        name=f"{first} {last}",
+        # Unique per user: the index fills the low digits
+        phone=f"{6000000000 + index:010d}",
+        email=f"{first.lower()}.{last.lower()}@example.com",
+        address=f"{rng.randint(1, 999)} {last} St",
+    )
+
+
+def seed_user(size):
+    """Create (or reuse) a user holding exactly `size` contacts"""
+    email = f"bench-{size}@example.com"
+    db = SessionLocal()
+    try:
+        user = crud.get_user_by_email(db, email)
+        if user is None:
+            user = crud.create_user(db, schemas.UserCreate(email=email, password=PASSWORD))
+        have = crud.count_contacts(db, user.id)
+        if have != size:
+            if have:
+                db.query(models.ContactNgram).filter(models.ContactNgram.user_id == user.id).delete()
+                db.query(models.Contact).filter(models.Contact.user_id == user.id).delete()
+                db.commit()
+                crud.reconcile_contact_counts(db, [user.id])
+            rng = random.Random(SEED + size)
+            started = time.perf_counter()
+            for start in range(0, size, SEED_BATCH_SIZE):
+                batch = [(i, random_contact(rng, i)) for i in range(start, min(size, start + SEED_BATCH_SIZE))]
+                crud.import_contacts(db, user.id, batch)
+            print(f"  seeded {size} contacts in {time.perf_counter() - started:.1f}s")
+        names = [row[0] for row in db.query(models.Contact.name).filter(models.Contact.user_id == user.id).limit(200)]
+        return email, user.id, names
+    finally:
+        db.close()
+
+
+async def measure(name, size, requests, concurrency, make_request):
+    """Issue `requests` calls from `concurrency` workers, returning a result row"""
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            ok = await make_request(i)
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    result = {
+        "scenario": name,
+        "size": size,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+    }
+    print(f"  {name:<18} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+          f"{result['throughput_rps']:>8.1f} req/s  errors {errors}")
+    return result
+
+
+async def bench_size(client, size, args):
+    print(f"[INFO] {size} contacts")
+    email, user_id, names = seed_user(size)
+    response = await client.post("/api/login", data={"username": email, "password": PASSWORD})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    rng = random.Random(SEED)
+    results = []
+
+    async def get(url, **params):
+        r = await client.get(url, params=params, headers=headers)
+        return r.status_code == 200
+
+    def typo(name):
+        i = rng.randrange(len(name))
+        return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+    # Warm the per-user search index and connection pools
+    for _ in range(args.warmup):
+        await get("/api/search", q=rng.choice(names)[:2])
+
+    # Cursor for the second-to-last page, to compare with the OFFSET query above
+    db = SessionLocal()
+    try:
+        deep = db.query(models.Contact).filter(models.Contact.user_id == user_id).order_by(
+            models.Contact.name.asc(), models.Contact.id.asc()
+        ).offset(max(0, size - 2 * PAGE_SIZE)).first()
+        deep_cursor = crud._encode_cursor(deep) if deep else ""
+    finally:
+        db.close()
+
+    first_page = await client.get("/api/contacts/", params={"page": 1, "page_size": PAGE_SIZE}, headers=headers)
+    etag = first_page.headers.get("etag", "")
+
+    async def not_modified(i):
+        r = await client.get("/api/contacts/", params={"page": 1, "page_size": PAGE_SIZE},
+                             headers={**headers, "If-None-Match": etag})
+        return r.status_code == 304
+
+    scenarios = [
+        ("search_short", lambda i: get("/api/search", q=rng.choice(names)[:2].lower())),
+        ("search_fuzzy", lambda i: get("/api/search", q=typo(rng.choice(names)))),
+        ("list_first_page", lambda i: get("/api/contacts/", page=1, page_size=PAGE_SIZE)),
+        ("list_deep_offset", lambda i: get("/api/contacts/", page=max(1, size // PAGE_SIZE - 1), page_size=PAGE_SIZE)),
+        ("list_deep_cursor", lambda i: get("/api/contacts/", cursor=deep_cursor, page_size=PAGE_SIZE)),
+        ("list_large_page", lambda i: get("/api/contacts/", page=1, page_size=LARGE_PAGE_SIZE)),
+        ("list_not_modified", not_modified),
+    ]
+    for name, make_request in scenarios:
+        results.append(await measure(name, size, args.requests, args.concurrency, make_request))
+
+    # Create, read, update and delete one contact per iteration
+    async def crud_cycle(i):
+        phone = f"{9000000000 + i:010d}"
+        r = await client.post("/api/contacts/", json={"name": f"Bench {i}", "phone": phone}, headers=headers)
+        if r.status_code != 201:
+            return False
+        contact_id = r.json()["id"]
+        ok = await get(f"/api/contacts/{contact_id}")
+        r = await client.put(f"/api/contacts/{contact_id}", json={"address": "Updated"}, headers=headers)
+        ok = ok and r.status_code == 200
+        r = await client.delete(f"/api/contacts/{contact_id}", headers=headers)
+        return ok and r.status_code == 204
+
+    results.append(await measure("contact_crud_cycle", size, args.requests, args.concurrency, crud_cycle))
+    return results
+
+
+async def run(args):
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    models.Base.metadata.create_all(bind=engine)
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for size in sizes:
+            results.extend(await bench_size(client, size, args))
+
+        # Login is bcrypt-bound and independent of address-book size
+        print("[INFO] login")
+        email = f"bench-{sizes[0]}@example.com"
+
+        async def login(i):
+            r = await client.post("/api/login", data={"username": email, "password": PASSWORD})
+            return r.status_code == 200
+
+        results.append(await measure("login", 0, args.login_requests, args.concurrency, login))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline_path, max_regression):
+    """Print p50/p99 changes against a previous run; return False on regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["scenario"], r["size"]): r for r in baseline["results"]}
+    print(f"\n[INFO] Compared with {baseline['meta']['commit']} ({baseline_path})")
+    ok = True
+    for result in current["results"]:
+        before = previous.get((result["scenario"], result["size"]))
+        if before is None:
+            continue
+        changes = []
+        regressed = False
+        for key in ("p50_ms", "p99_ms"):
+            change = (result[key] - before[key]) / before[key] if before[key] else 0.0
+            changes.append(f"{key} {before[key]:.2f} -> {result[key]:.2f} ({change:+.0%})")
+            if key == "p99_ms" and change > max_regression:
+                regressed = True
+        ok = ok and not regressed
+        flag = "  <-- regression" if regressed else ""
+        print(f"  {result['scenario']:<18} {result['size']:>7}  " + "  ".join(changes) + flag)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated address-book sizes")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=20, help="requests for the login scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent in-flight requests")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed search requests per size")
+    parser.add_argument("--output", help="JSON results path (default: benchmark_results/<commit>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p99 slowdown when comparing")
+    args = parser.parse_args()
+
+    print(f"[INFO] Benchmarking against {engine.url.render_as_string(hide_password=True)}")
+    results = asyncio.run(run(args))
+
+    output = args.output or os.path.join("benchmark_results", f"{results['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[SUCCESS] Results written to {output}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
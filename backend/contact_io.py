@@ -0,0 +1,228 @@
+import codecs
+import csv
+import io
+import json
+import re
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Import/export formats and the content types that select them
+FORMATS = {
+    "csv": ("text/csv",),
+    "jsonl": ("application/jsonl", "application/x-ndjson", "application/x-jsonlines"),
+    "vcard": ("text/vcard", "text/x-vcard"),
+}
+
+CONTACT_FIELDS = ("name", "phone", "email", "address")
+
+# Columns streamed by crud.stream_contacts, in order
+EXPORT_FIELDS = ("id", "name", "phone", "email", "address", "created_at")
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "vcard": "text/vcard",
+}
+EXPORT_EXTENSIONS = {"csv": "csv", "jsonl": "ndjson", "vcard": "vcf"}
+
+# Rows encoded per chunk written to the response
+EXPORT_CHUNK_ROWS = 500
+
+# (row number, parsed fields, error message) for each record in an upload
+ParsedRow = Tuple[int, Optional[Dict[str, Optional[str]]], Optional[str]]
+
+
+def detect_format(fmt: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Pick the format from an explicit ?format= or the request's Content-Type"""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt == "ndjson":
+            fmt = "jsonl"
+        return fmt if fmt in FORMATS else None
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    for name, media_types in FORMATS.items():
+        if media_type in media_types:
+            return name
+    return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a streamed UTF-8 body into lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        # The last piece may be an incomplete line
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def parse(fmt: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+    """Parse a streamed upload in the given format into contact field dicts"""
+    parser = {"csv": _parse_csv, "jsonl": _parse_jsonl, "vcard": _parse_vcard}[fmt]
+    async for row in parser(iter_lines(chunks)):
+        yield row
+
+
+def _clean(fields: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    """Keep known contact fields, turning blank optional values into None"""
+    cleaned = {}
+    for key in CONTACT_FIELDS:
+        value = fields.get(key)
+        # JSONL may carry phones as numbers
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if isinstance(value, str):
+            value = value.strip()
+            if not value and key in ("email", "address"):
+                value = None
+        cleaned[key] = value
+    return cleaned
+
+
+async def _parse_csv(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRow]:
+    header: Optional[List[str]] = None
+    row_number = 0
+    record = ""
+    async for line in lines:
+        # A quoted field may span lines; wait until the quotes balance
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [column.strip().lower() for column in values]
+            if "name" not in header or "phone" not in header:
+                yield 0, None, "CSV header must include name and phone columns"
+                return
+            continue
+        row_number += 1
+        yield row_number, _clean(dict(zip(header, values))), None
+    if record:
+        row_number += 1
+        yield row_number, None, "Unterminated quoted field"
+
+
+async def _parse_jsonl(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRow]:
+    row_number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            fields = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(fields, dict):
+            yield row_number, None, "Each line must be a JSON object"
+            continue
+        yield row_number, _clean(fields), None
+
+
+def _vcard_unescape(value: str) -> str:
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def _vcard_split(value: str, sep: str) -> List[str]:
+    """Split on unescaped separators"""
+    return [_vcard_unescape(part) for part in re.split(r"(?<!\\)" + re.escape(sep), value)]
+
+
+async def _parse_vcard(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRow]:
+    row_number = 0
+    card: Optional[Dict[str, Optional[str]]] = None
+    previous: Optional[str] = None
+
+    def apply(line: str):
+        prop, _, value = line.partition(":")
+        name = prop.split(";")[0].split(".")[-1].upper()
+        if name == "FN":
+            card["name"] = _vcard_unescape(value)
+        elif name == "N" and not card.get("name"):
+            # Family;Given;Additional;Prefix;Suffix
+            parts = _vcard_split(value, ";")
+            card["name"] = " ".join(p for p in parts[3:4] + parts[1:3] + parts[0:1] + parts[4:5] if p)
+        elif name == "TEL" and not card.get("phone"):
+            # vCard numbers are usually formatted for display, or given as tel: URIs
+            if value.lower().startswith("tel:"):
+                value = value[4:]
+            card["phone"] = re.sub(r"[\s().-]", "", value)
+        elif name == "EMAIL" and not card.get("email"):
+            card["email"] = value
+        elif name == "ADR" and not card.get("address"):
+            card["address"] = ", ".join(p for p in _vcard_split(value, ";") if p.strip())
+
+    async for line in lines:
+        # Folded lines continue with a leading space or tab
+        if line[:1] in (" ", "\t") and previous is not None:
+            previous += line[1:]
+            continue
+        if previous is not None and card is not None:
+            apply(previous)
+        previous = None
+        upper = line.strip().upper()
+        if upper == "BEGIN:VCARD":
+            card = {}
+        elif upper == "END:VCARD":
+            if card is not None:
+                row_number += 1
+                yield row_number, _clean(card), None
+            card = None
+        elif card is not None and line.strip():
+            previous = line
+    if card is not None:
+        row_number += 1
+        yield row_number, None, "Missing END:VCARD"
+
+
+def export(fmt: str, rows: Iterable[tuple]) -> Iterator[str]:
+    """Encode plain (EXPORT_FIELDS) tuples as chunks of the given format"""
+    encode = {"csv": _csv_rows, "jsonl": _jsonl_rows, "vcard": _vcard_rows}[fmt]
+    chunk: List[str] = []
+    if fmt == "csv":
+        chunk.extend(_csv_rows([EXPORT_FIELDS]))
+    for row in rows:
+        chunk.extend(encode([row]))
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk.clear()
+    if chunk:
+        yield "".join(chunk)
+
+
+def _csv_rows(rows: Iterable[tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+    yield buffer.getvalue()
+
+
+def _jsonl_rows(rows: Iterable[tuple]) -> Iterator[str]:
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        if record["created_at"] is not None:
+            record["created_at"] = record["created_at"].isoformat()
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _vcard_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _vcard_rows(rows: Iterable[tuple]) -> Iterator[str]:
+    for contact_id, name, phone, email, address, _ in rows:
+        lines = ["BEGIN:VCARD", "VERSION:3.0", f"FN:{_vcard_escape(name)}", f"N:{_vcard_escape(name)};;;;"]
+        lines.append(f"TEL;TYPE=CELL:{phone}")
+        if email:
+            lines.append(f"EMAIL:{_vcard_escape(email)}")
+        if address:
+            lines.append(f"ADR:;;{_vcard_escape(address)};;;;")
+        lines.append("END:VCARD")
+        yield "\r\n".join(lines) + "\r\n"
@@ -1,8 +1,17 @@
+from sqlalchemy import and_, delete, insert, or_, select, func, tuple_, update
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import base64
+import binascii
+import json
 import models
 import schemas
 import auth
+import search_index
+from database import pin_to_primary
 
 # User CRUD
 def get_user(db: Session, user_id: int):
@@ -11,6 +20,9 @@ def get_user(db: Session, user_id: int):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    return (await db.scalars(select(models.User).where(models.User.email == email))).first()
+
 def create_user(db: Session, user: schemas.UserCreate):
     hashed_password = auth.get_password_hash(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password)
@@ -19,54 +31,403 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+async def create_user_async(db: AsyncSession, user: schemas.UserCreate, hashed_password: str):
+    """Create a user whose password was already hashed on the hashing pool"""
+    db_user = models.User(email=user.email, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def update_password_hash_async(db: AsyncSession, user_id: int, hashed_password: str):
+    await db.execute(
+        update(models.User).where(models.User.id == user_id).values(hashed_password=hashed_password)
+    )
+    await db.commit()
+
 # Contact CRUD
+# Statements shared by the sync functions and their *_async variants
+def _contact_stmt(contact_id: int, user_id: int):
+    return select(models.Contact).where(models.Contact.id == contact_id, models.Contact.user_id == user_id)
+
+def _contacts_page_stmt(user_id: int, skip: int, limit: int, columns: Optional[List] = None):
+    return (
+        (select(*columns) if columns else select(models.Contact))
+        .where(models.Contact.user_id == user_id)
+        .order_by(models.Contact.name.asc(), models.Contact.id.asc())
+        .offset(skip)
+        .limit(limit)
+    )
+
+def _contacts_after_stmt(user_id: int, cursor: Optional[str], limit: int, columns: Optional[List] = None):
+    stmt = (select(*columns) if columns else select(models.Contact)).where(models.Contact.user_id == user_id)
+    # Seek past the last (name, id) of the previous page instead of OFFSET
+    if cursor:
+        last_name, last_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(models.Contact.name, models.Contact.id) > tuple_(last_name, last_id))
+    # Fetch one extra row to know whether another page exists
+    return stmt.order_by(models.Contact.name.asc(), models.Contact.id.asc()).limit(limit + 1)
+
+def _contact_columns(fields: Tuple[str, ...]) -> List:
+    return [getattr(models.Contact, field) for field in fields]
+
+def _contact_count_stmt(user_id: int):
+    return select(models.User.contact_count).where(models.User.id == user_id)
+
+def _split_page(contacts: List[models.Contact], limit: int) -> Tuple[List[models.Contact], Optional[str]]:
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        return contacts, _encode_cursor(contacts[-1])
+    return contacts, None
+
 def get_contact(db: Session, contact_id: int, user_id: int) -> Optional[models.Contact]:
     """Get a single contact by ID and User ID"""
-    return db.query(models.Contact).filter(models.Contact.id == contact_id, models.Contact.user_id == user_id).first()
+    return db.scalars(_contact_stmt(contact_id, user_id)).first()
 
 def get_contacts(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     """Get all contacts for a user with pagination and sorting"""
-    # Create base query
-    query = db.query(models.Contact).filter(models.Contact.user_id == user_id)
-    
-    # Get total count
-    total = query.count()
+    # Total comes from the maintained counter rather than COUNT(*)
+    total = count_contacts(db, user_id)
     
     # Get paginated results with sorting
-    contacts = query.order_by(models.Contact.name.asc()).offset(skip).limit(limit).all()
+    contacts = db.scalars(_contacts_page_stmt(user_id, skip, limit)).all()
     
     return contacts, total
 
-def create_contact(db: Session, contact: schemas.ContactCreate, user_id: int) -> models.Contact:
-    """Create a new contact for a user"""
-    # Check if phone number already exists for this user
-    existing_contact = db.query(models.Contact).filter(
-        models.Contact.user_id == user_id,
-        models.Contact.phone == contact.phone
+def get_contacts_after(db: Session, user_id: int, cursor: Optional[str], limit: int = 100) -> Tuple[List[models.Contact], Optional[str]]:
+    """Get the page of contacts following `cursor` using keyset pagination"""
+    contacts = db.scalars(_contacts_after_stmt(user_id, cursor, limit)).all()
+    return _split_page(contacts, limit)
+
+async def get_contact_async(db: AsyncSession, contact_id: int, user_id: int) -> Optional[models.Contact]:
+    """Async variant of get_contact"""
+    return (await db.scalars(_contact_stmt(contact_id, user_id))).first()
+
+async def get_contacts_async(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    """Async variant of get_contacts"""
+    total = await count_contacts_async(db, user_id)
+    contacts = (await db.scalars(_contacts_page_stmt(user_id, skip, limit))).all()
+    return contacts, total
+
+async def get_contacts_after_async(db: AsyncSession, user_id: int, cursor: Optional[str], limit: int = 100) -> Tuple[List[models.Contact], Optional[str]]:
+    """Async variant of get_contacts_after"""
+    contacts = (await db.scalars(_contacts_after_stmt(user_id, cursor, limit))).all()
+    return _split_page(contacts, limit)
+
+async def get_contact_rows_async(db: AsyncSession, user_id: int, fields: Tuple[str, ...], skip: int = 0, limit: int = 100) -> Tuple[List[tuple], int]:
+    """Like get_contacts_async, but selects only `fields` and returns plain tuples"""
+    total = await count_contacts_async(db, user_id)
+    rows = (await db.execute(_contacts_page_stmt(user_id, skip, limit, _contact_columns(fields)))).tuples().all()
+    return rows, total
+
+async def get_contact_rows_after_async(db: AsyncSession, user_id: int, fields: Tuple[str, ...], cursor: Optional[str], limit: int = 100) -> Tuple[List[tuple], Optional[str]]:
+    """Like get_contacts_after_async, but selects only `fields` and returns plain tuples"""
+    # name and id are appended for the next cursor and sliced off again
+    columns = _contact_columns(fields) + [models.Contact.name, models.Contact.id]
+    rows = (await db.execute(_contacts_after_stmt(user_id, cursor, limit, columns))).tuples().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _cursor_for(rows[-1][-2], rows[-1][-1])
+    return [row[:-2] for row in rows], next_cursor
+
+async def count_contacts_async(db: AsyncSession, user_id: int) -> int:
+    """Async variant of count_contacts"""
+    return (await db.scalar(_contact_count_stmt(user_id))) or 0
+
+def _encode_cursor(contact: models.Contact) -> str:
+    """Opaque cursor pointing just after `contact` in (name, id) order"""
+    return _cursor_for(contact.name, contact.id)
+
+def _cursor_for(name: str, contact_id: int) -> str:
+    raw = json.dumps([name, contact_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, contact_id = json.loads(raw)
+        if not isinstance(name, str) or not isinstance(contact_id, int):
+            raise ValueError(cursor)
+    except (ValueError, TypeError, binascii.Error):
+        from fastapi import HTTPException
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return name, contact_id
+
+# Columns search_index.IndexedContact reads
+_INDEX_COLUMNS = (
+    models.Contact.id, models.Contact.user_id, models.Contact.name, models.Contact.phone,
+    models.Contact.email, models.Contact.address, models.Contact.created_at,
+    models.Contact.name_norm, models.Contact.phone_digits, models.Contact.email_norm,
+)
+
+def get_all_contacts(db: Session, user_id: int) -> List:
+    """Get every contact for a user as plain rows, used to build the search index"""
+    # Rows skip ORM identity-map bookkeeping, which dominates loading large books
+    return db.execute(select(*_INDEX_COLUMNS).where(models.Contact.user_id == user_id)).all()
+
+def get_dedupe_contacts(db: Session, user_id: int) -> List:
+    """Get every contact for a user as plain rows, with the stored phonetic key used for blocking"""
+    return db.execute(
+        select(*_INDEX_COLUMNS, models.Contact.name_phonetic).where(models.Contact.user_id == user_id)
+    ).all()
+
+_EXPORT_COLUMNS = (
+    models.Contact.id, models.Contact.name, models.Contact.phone,
+    models.Contact.email, models.Contact.address, models.Contact.created_at,
+)
+
+def stream_contacts(db: Session, user_id: int, batch_size: int = 1000) -> Iterator[tuple]:
+    """Yield a user's contacts as plain tuples, reading one keyset page of `batch_size` at a time"""
+    # Paging keeps memory flat on every driver; stream_results silently buffers
+    # everything on drivers without server-side cursors, such as mysqlconnector
+    cursor = None
+    while True:
+        rows = db.execute(_contacts_after_stmt(user_id, cursor, batch_size, _EXPORT_COLUMNS)).all()
+        page = rows[:batch_size]
+        for row in page:
+            yield tuple(row)
+        if len(rows) <= batch_size:
+            return
+        cursor = _cursor_for(page[-1].name, page[-1].id)
+
+def count_contacts(db: Session, user_id: int) -> int:
+    """Get the number of contacts for a user from users.contact_count"""
+    return db.scalar(_contact_count_stmt(user_id)) or 0
+
+def get_index_state(db: Session, user_id: int) -> Tuple[int, Optional[int]]:
+    """The user's contact count and data version in one lookup; the version is None if the user is gone"""
+    row = db.execute(
+        select(models.User.contact_count, models.User.data_version).where(models.User.id == user_id)
     ).first()
+    return (row.contact_count, row.data_version) if row is not None else (0, None)
+
+def _touch_user(db: Session, user_id: int, count_delta: int = 0) -> Optional[int]:
+    """Bump the user's data version and shift the contact counter inside the current transaction
     
-    if existing_contact:
-        from fastapi import HTTPException
-        raise HTTPException(
-            status_code=400, 
-            detail=f"A contact with phone number {contact.phone} already exists"
+    Returns the new data version, or None if the user is gone.
+    """
+    values = {models.User.data_version: models.User.data_version + 1}
+    if count_delta:
+        values[models.User.contact_count] = models.User.contact_count + count_delta
+    stmt = update(models.User).where(models.User.id == user_id).values(values).execution_options(synchronize_session=False)
+    if db.get_bind().dialect.update_returning:
+        version = db.execute(stmt.returning(models.User.data_version)).scalar()
+    else:
+        db.execute(stmt)
+        # The UPDATE holds the row lock until commit, so this reads our own write
+        version = db.scalar(select(models.User.data_version).where(models.User.id == user_id))
+    # Replicas may not have the change yet
+    pin_to_primary(user_id)
+    return version
+
+async def get_data_version_async(db: AsyncSession, user_id: int) -> Optional[int]:
+    """Current data version of a user's contacts, or None if the user is gone"""
+    return await db.scalar(select(models.User.data_version).where(models.User.id == user_id))
+
+def reconcile_contact_counts(db: Session, user_ids: Optional[List[int]] = None) -> int:
+    """Recompute users.contact_count from the contacts table, returning rows changed"""
+    actual = (
+        select(func.count(models.Contact.id))
+        .where(models.Contact.user_id == models.User.id)
+        .scalar_subquery()
+    )
+    query = db.query(models.User).filter(models.User.contact_count != actual)
+    if user_ids is not None:
+        query = query.filter(models.User.id.in_(user_ids))
+    changed = query.update(
+        {models.User.contact_count: actual, models.User.data_version: models.User.data_version + 1},
+        synchronize_session=False
+    )
+    db.commit()
+    return changed
+
+def _prefix_range(column, prefix: str):
+    """`column` starts with `prefix`, as a range any collation can serve from an index"""
+    if ord(prefix[-1]) == 0x10FFFF:
+        return column >= prefix
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+def search_contact_candidates(db: Session, user_id: int, q: str, limit: int) -> List[models.Contact]:
+    """Narrow a user's contacts down to at most `limit` likely matches for `q` in the database"""
+    query = db.query(models.Contact).filter(models.Contact.user_id == user_id)
+    q = q.strip()
+    grams = search_index.ngrams(q)
+    
+    if not q:
+        return query.order_by(models.Contact.name.asc()).limit(limit).all()
+    
+    q_norm = search_index.normalize_text(q)
+    q_digits = search_index.phone_digits(q)
+    
+    # Too short for trigrams: prefix matches on the normalized keys, then contains matches
+    if len(q) <= 2 or not grams:
+        prefixes = [_prefix_range(models.Contact.name_norm, q_norm), _prefix_range(models.Contact.email_norm, q_norm)]
+        contains = [
+            models.Contact.name_norm.contains(q_norm, autoescape=True),
+            models.Contact.email_norm.contains(q_norm, autoescape=True),
+        ]
+        if q_digits:
+            prefixes.append(_prefix_range(models.Contact.phone_digits, q_digits))
+            contains.append(models.Contact.phone_digits.contains(q_digits, autoescape=True))
+        return _candidates_in_order(query, [or_(*prefixes), or_(*contains)], limit)
+    
+    # Sounds-like names and phone prefixes are precise, so they are taken first
+    precise = []
+    key = search_index.phonetic_key(q)
+    if key:
+        precise.append(_prefix_range(models.Contact.name_phonetic, key))
+    if len(q_digits) >= 3:
+        precise.append(_prefix_range(models.Contact.phone_digits, q_digits))
+    candidates = _candidates_in_order(query, [or_(*precise)], limit) if precise else []
+    if len(candidates) >= limit:
+        return candidates
+    seen = [c.id for c in candidates]
+    remaining = limit - len(candidates)
+    
+    if _uses_fulltext(db):
+        # Natural language mode returns rows by relevance
+        relevance = mysql.match(
+            models.Contact.name, models.Contact.phone, models.Contact.email, against=q
+        ).in_natural_language_mode()
+        return candidates + query.filter(relevance, models.Contact.id.notin_(seen)).limit(remaining).all()
+    
+    # Contacts sharing the most trigrams with the query
+    candidate_ids = db.execute(
+        select(models.ContactNgram.contact_id)
+        .where(
+            models.ContactNgram.user_id == user_id,
+            models.ContactNgram.gram.in_(grams),
+            models.ContactNgram.contact_id.notin_(seen),
         )
+        .group_by(models.ContactNgram.contact_id)
+        .order_by(func.count().desc())
+        .limit(remaining)
+    ).scalars().all()
+    if not candidate_ids:
+        return candidates
+    return candidates + query.filter(models.Contact.id.in_(candidate_ids)).all()
+
+def search_contacts_substring(
+    db: Session, user_id: int, q: str, offset: int = 0, limit: Optional[int] = None
+) -> Tuple[List[models.Contact], int]:
+    """Contacts containing `q` in name, phone digits or email, in name order, with the total match count
+
+    The database counts and pages the matches, for books too large for the
+    in-memory index; an empty `q` matches every contact.
+    """
+    conditions = [models.Contact.user_id == user_id]
+    if q.strip():
+        q_norm = search_index.normalize_text(q)
+        q_digits = search_index.phone_query_digits(q)
+        matches = [
+            models.Contact.name_norm.contains(q_norm, autoescape=True),
+            models.Contact.email_norm.contains(q_norm, autoescape=True),
+        ]
+        if q_digits:
+            matches.append(models.Contact.phone_digits.contains(q_digits, autoescape=True))
+        conditions.append(or_(*matches))
+        total = db.scalar(select(func.count()).select_from(models.Contact).where(*conditions)) or 0
+    else:
+        total = count_contacts(db, user_id)
+    stmt = select(models.Contact).where(*conditions).order_by(
+        models.Contact.name.asc(), models.Contact.id.asc()
+    ).offset(offset)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return db.scalars(stmt).all(), total
+
+def suggest_contacts(db: Session, user_id: int, prefix: str, limit: int) -> List[Tuple]:
+    """Typeahead for books too large for the in-memory index: (row, matched key) pairs in key order
     
+    Each key is one range scan on its (user_id, key) index; later name tokens
+    have no index and are only matched in memory.
+    """
+    prefix = search_index.normalize_prefix(prefix)
+    if not prefix:
+        return []
+    found = {}
+    for key in (models.Contact.name_norm, models.Contact.phone_digits, models.Contact.email_norm):
+        rows = db.execute(
+            select(models.Contact.id, models.Contact.name, models.Contact.phone, models.Contact.email, key.label("match"))
+            .where(models.Contact.user_id == user_id, _prefix_range(key, prefix))
+            .order_by(key.asc(), models.Contact.id.asc())
+            .limit(limit)
+        ).all()
+        for row in rows:
+            found.setdefault(row.id, (row, row.match))
+    return sorted(found.values(), key=lambda item: (item[1], item[0].id))[:limit]
+
+def _candidates_in_order(query, conditions: List, limit: int) -> List[models.Contact]:
+    """Contacts matching each condition in turn, by name, until `limit` are found"""
+    found: List[models.Contact] = []
+    for condition in conditions:
+        if len(found) >= limit:
+            break
+        found += query.filter(condition, models.Contact.id.notin_([c.id for c in found])).order_by(
+            models.Contact.name.asc()
+        ).limit(limit - len(found)).all()
+    return found
+
+def _uses_fulltext(db: Session) -> bool:
+    """MySQL prefilters search with its FULLTEXT index, other backends with contact_ngrams"""
+    return db.get_bind().dialect.name == "mysql"
+
+def _index_ngrams(db: Session, contacts: List[models.Contact], replace: bool = False):
+    """Write the contacts' search trigrams to contact_ngrams"""
+    if _uses_fulltext(db) or not contacts:
+        return
+    if replace:
+        db.query(models.ContactNgram).filter(
+            models.ContactNgram.contact_id.in_([c.id for c in contacts])
+        ).delete(synchronize_session=False)
+    rows = [
+        {"contact_id": c.id, "user_id": c.user_id, "gram": gram}
+        for c in contacts
+        for gram in search_index.ngrams(search_index.search_text(c.name, c.phone, c.email))
+    ]
+    if rows:
+        db.execute(insert(models.ContactNgram), rows)
+
+def _is_duplicate_phone(e: IntegrityError) -> bool:
+    """Whether an IntegrityError was raised by the uq_user_phone constraint"""
+    orig = e.orig
+    errno = getattr(orig, "errno", None)
+    if errno is None and orig is not None and orig.args and isinstance(orig.args[0], int):
+        errno = orig.args[0]
+    message = str(orig)
+    return (
+        errno == 1062  # MySQL ER_DUP_ENTRY
+        or "uq_user_phone" in message
+        or "UNIQUE constraint failed: contacts.user_id, contacts.phone" in message  # SQLite
+    )
+
+def _duplicate_phone_error(phone: Optional[str]):
+    from fastapi import HTTPException
+    if phone:
+        return HTTPException(status_code=400, detail=f"A contact with phone number {phone} already exists")
+    return HTTPException(status_code=400, detail="A contact with this phone number already exists")
+
+def create_contact(db: Session, contact: schemas.ContactCreate, user_id: int) -> models.Contact:
+    """Create a new contact for a user"""
     db_contact = models.Contact(
         **contact.model_dump(),
+        **search_index.normalized_fields(contact.name, contact.phone, contact.email),
         user_id=user_id
     )
     db.add(db_contact)
+    # uq_user_phone enforces unique phones; created_at is set client-side, so no refresh is needed
     try:
+        db.flush()
+        _index_ngrams(db, [db_contact])
+        version = _touch_user(db, user_id, 1)
         db.commit()
-        db.refresh(db_contact)
-    except Exception as e:
+    except IntegrityError as e:
         db.rollback()
-        # Check for duplicate entry error (MySQL error code 1062)
-        if "1062" in str(e) or "Duplicate entry" in str(e):
-            from fastapi import HTTPException
-            raise HTTPException(status_code=400, detail=f"A contact with phone number {contact.phone} already exists")
-        raise e
+        if _is_duplicate_phone(e):
+            raise _duplicate_phone_error(contact.phone)
+        raise
+    search_index.index.upsert(db_contact, version)
     return db_contact
 
 def update_contact(db: Session, contact_id: int, contact: schemas.ContactUpdate, user_id: int) -> Optional[models.Contact]:
@@ -78,41 +439,267 @@ def update_contact(db: Session, contact_id: int, contact: schemas.ContactUpdate,
     # Update only provided fields
     update_data = contact.model_dump(exclude_unset=True)
     
-    # If phone is being updated, check for duplicates
-    if 'phone' in update_data:
-        existing_contact = db.query(models.Contact).filter(
-            models.Contact.user_id == user_id,
-            models.Contact.phone == update_data['phone'],
-            models.Contact.id != contact_id  # Exclude current contact
-        ).first()
-        
-        if existing_contact:
-            from fastapi import HTTPException
-            raise HTTPException(
-                status_code=400, 
-                detail=f"A contact with phone number {update_data['phone']} already exists"
-            )
-    
     for key, value in update_data.items():
         setattr(db_contact, key, value)
+    if update_data.keys() & {'name', 'phone', 'email'}:
+        normalized = search_index.normalized_fields(db_contact.name, db_contact.phone, db_contact.email)
+        for key, value in normalized.items():
+            setattr(db_contact, key, value)
     
     try:
+        # Flush first so the contact row is locked before the user row, as in create/delete
+        db.flush()
+        if update_data.keys() & {'name', 'phone', 'email'}:
+            _index_ngrams(db, [db_contact], replace=True)
+        version = _touch_user(db, user_id)
         db.commit()
-        db.refresh(db_contact)
-    except Exception as e:
+    except IntegrityError as e:
         db.rollback()
-        if "1062" in str(e) or "Duplicate entry" in str(e):
-            from fastapi import HTTPException
-            raise HTTPException(status_code=400, detail=f"A contact with this phone number already exists")
-        raise e
+        if _is_duplicate_phone(e):
+            raise _duplicate_phone_error(update_data.get('phone'))
+        raise
+    search_index.index.upsert(db_contact, version)
     return db_contact
 
 def delete_contact(db: Session, contact_id: int, user_id: int) -> bool:
     """Delete a contact for a user"""
-    db_contact = get_contact(db, contact_id, user_id)
-    if db_contact is None:
+    # One scoped DELETE; rowcount tells whether the user owned the contact
+    deleted = db.execute(
+        delete(models.Contact).where(models.Contact.id == contact_id, models.Contact.user_id == user_id)
+    ).rowcount
+    if not deleted:
+        db.rollback()
         return False
     
-    db.delete(db_contact)
+    # contact_ngrams rows go with the contact through ON DELETE CASCADE
+    version = _touch_user(db, user_id, -1)
     db.commit()
+    search_index.index.remove(user_id, contact_id, version)
     return True
+
+# Contacts per transaction in batch operations
+BATCH_CHUNK_SIZE = 500
+
+def _filter_conditions(contact_filter: schemas.ContactFilter) -> List:
+    conditions = []
+    if contact_filter.name_prefix:
+        conditions.append(_prefix_range(models.Contact.name_norm, search_index.normalized_key(contact_filter.name_prefix)))
+    if contact_filter.phone_prefix:
+        conditions.append(_prefix_range(models.Contact.phone_digits, search_index.phone_digits(contact_filter.phone_prefix) or contact_filter.phone_prefix))
+    if contact_filter.has_email is not None:
+        conditions.append(models.Contact.email.isnot(None) if contact_filter.has_email else models.Contact.email.is_(None))
+    if contact_filter.created_before is not None:
+        conditions.append(models.Contact.created_at < contact_filter.created_before)
+    if contact_filter.created_after is not None:
+        conditions.append(models.Contact.created_at >= contact_filter.created_after)
+    return conditions
+
+def _batch_chunks(db: Session, user_id: int, selection: schemas.ContactBatchSelection) -> Iterator[Tuple[List[int], List[int]]]:
+    """Yield (requested ids, ids the user owns) one chunk at a time, locking the owned rows"""
+    owned = select(models.Contact.id).where(models.Contact.user_id == user_id).with_for_update()
+    if selection.ids is not None:
+        ids = list(dict.fromkeys(selection.ids))
+        for start in range(0, len(ids), BATCH_CHUNK_SIZE):
+            chunk = ids[start:start + BATCH_CHUNK_SIZE]
+            yield chunk, db.execute(owned.where(models.Contact.id.in_(chunk))).scalars().all()
+        return
+    # A filter is walked in id order so each chunk resumes after the previous one
+    conditions = _filter_conditions(selection.filter)
+    last_id = 0
+    while True:
+        found = db.execute(
+            owned.where(models.Contact.id > last_id, *conditions).order_by(models.Contact.id).limit(BATCH_CHUNK_SIZE)
+        ).scalars().all()
+        if not found:
+            return
+        yield found, found
+        last_id = found[-1]
+
+def _batch_outcomes(requested: List[int], found: List[int], status: str) -> List[Dict]:
+    found = set(found)
+    return [{"id": contact_id, "status": status if contact_id in found else "not_found"} for contact_id in requested]
+
+def delete_contacts(
+    db: Session, user_id: int, selection: schemas.ContactBatchSelection, progress: Optional[Callable[[int], None]] = None
+) -> List[Dict]:
+    """Delete the selected contacts with one DELETE per chunk, returning per-id outcomes
+
+    `progress`, if given, is called after each committed chunk with the number
+    of ids handled so far; an exception it raises stops the remaining chunks.
+    """
+    outcomes = []
+    for requested, found in _batch_chunks(db, user_id, selection):
+        if found:
+            deleted = db.execute(
+                delete(models.Contact).where(models.Contact.user_id == user_id, models.Contact.id.in_(found))
+            ).rowcount
+            # Trigrams are removed by ON DELETE CASCADE through the contact_ngrams primary key
+            _touch_user(db, user_id, -deleted)
+        # One transaction per chunk; also releases the row locks of an empty chunk
+        db.commit()
+        if found:
+            search_index.index.invalidate(user_id)
+        outcomes.extend(_batch_outcomes(requested, found, "deleted"))
+        if progress:
+            progress(len(outcomes))
+    return outcomes
+
+def update_contacts(
+    db: Session, user_id: int, selection: schemas.ContactBatchSelection, changes: schemas.ContactBatchChanges,
+    progress: Optional[Callable[[int], None]] = None
+) -> List[Dict]:
+    """Apply the same changes to the selected contacts with one UPDATE per chunk, returning per-id outcomes
+
+    `progress` is called after each committed chunk, as in delete_contacts.
+    """
+    values = changes.model_dump(exclude_unset=True)
+    if "name" in values:
+        values["name_norm"] = search_index.normalized_key(values["name"])
+        values["name_phonetic"] = search_index.phonetic_key(values["name"])
+    if "email" in values:
+        values["email_norm"] = search_index.normalized_key(values["email"]) or None
+    reindex = bool(values.keys() & {"name", "email"}) and not _uses_fulltext(db)
+    
+    outcomes = []
+    for requested, found in _batch_chunks(db, user_id, selection):
+        if found:
+            scope = (models.Contact.user_id == user_id, models.Contact.id.in_(found))
+            db.execute(update(models.Contact).where(*scope).values(values).execution_options(synchronize_session=False))
+            if reindex:
+                # Trigrams cover name, phone and email together, so each contact is re-tokenized
+                rows = db.execute(select(*_INDEX_COLUMNS).where(*scope)).all()
+                _index_ngrams(db, rows, replace=True)
+            _touch_user(db, user_id)
+        db.commit()
+        if found:
+            search_index.index.invalidate(user_id)
+        outcomes.extend(_batch_outcomes(requested, found, "updated"))
+        if progress:
+            progress(len(outcomes))
+    return outcomes
+
+# Clusters per transaction when merging duplicates
+MERGE_CHUNK_CLUSTERS = 100
+
+def merge_contacts(
+    db: Session, user_id: int, clusters: List[schemas.MergeCluster], progress: Optional[Callable[[int], None]] = None
+) -> List[Dict]:
+    """Fold each cluster's duplicates into its primary and delete them, chunk by chunk
+    
+    The primary keeps its own name and phone; an email or address it lacks is
+    taken from the first duplicate that has one. `progress` is called after
+    each committed chunk with the number of clusters handled so far.
+    """
+    outcomes = []
+    claimed = set()
+    for start in range(0, len(clusters), MERGE_CHUNK_CLUSTERS):
+        chunk = clusters[start:start + MERGE_CHUNK_CLUSTERS]
+        ids = {c.primary_id for c in chunk} | {i for c in chunk for i in c.duplicate_ids}
+        rows = {
+            row.id: row for row in db.execute(
+                select(*_INDEX_COLUMNS).where(models.Contact.user_id == user_id, models.Contact.id.in_(ids)).with_for_update()
+            )
+        }
+        
+        fills, doomed = [], []
+        for cluster in chunk:
+            members = [cluster.primary_id] + [i for i in dict.fromkeys(cluster.duplicate_ids) if i != cluster.primary_id]
+            if claimed.intersection(members):
+                outcomes.append({"primary_id": cluster.primary_id, "status": "conflict", "merged_ids": []})
+                continue
+            if any(i not in rows for i in members) or len(members) < 2:
+                outcomes.append({"primary_id": cluster.primary_id, "status": "not_found", "merged_ids": []})
+                continue
+            claimed.update(members)
+            primary, duplicates = rows[cluster.primary_id], [rows[i] for i in members[1:]]
+            values = {}
+            for field in ("email", "address"):
+                if getattr(primary, field) is None:
+                    value = next((getattr(d, field) for d in duplicates if getattr(d, field) is not None), None)
+                    if value is not None:
+                        values[field] = value
+            if "email" in values:
+                values["email_norm"] = search_index.normalized_key(values["email"])
+            if values:
+                fills.append({"id": primary.id, **values})
+            doomed.extend(members[1:])
+            outcomes.append({"primary_id": primary.id, "status": "merged", "merged_ids": members[1:]})
+        
+        if doomed:
+            # Trigrams go with the contacts through ON DELETE CASCADE; rowcount excludes
+            # duplicates a concurrent request deleted first (SQLite ignores FOR UPDATE)
+            deleted = db.execute(
+                delete(models.Contact).where(models.Contact.user_id == user_id, models.Contact.id.in_(doomed))
+            ).rowcount
+            if fills:
+                # Bulk UPDATE by primary key, executed as one executemany
+                db.execute(update(models.Contact), fills)
+                if any("email" in fill for fill in fills):
+                    filled = db.execute(select(*_INDEX_COLUMNS).where(
+                        models.Contact.id.in_([fill["id"] for fill in fills if "email" in fill])
+                    )).all()
+                    _index_ngrams(db, filled, replace=True)
+            _touch_user(db, user_id, -deleted)
+        db.commit()
+        if doomed:
+            search_index.index.invalidate(user_id)
+        if progress:
+            progress(len(outcomes))
+    return outcomes
+
+def import_contacts(db: Session, user_id: int, batch: List[Tuple[int, schemas.ContactCreate]]) -> Tuple[int, List[Dict]]:
+    """Insert a batch of validated contacts with one multi-row INSERT
+    
+    `batch` holds (row number, contact) pairs; rows whose phone already exists for
+    the user or repeats earlier in the batch are reported back instead of inserted.
+    """
+    # A concurrent writer can take a phone between the check and the insert; retry once
+    for attempt in range(2):
+        errors = []
+        phones = {contact.phone for _, contact in batch}
+        existing = set(db.execute(
+            select(models.Contact.phone).where(
+                models.Contact.user_id == user_id,
+                models.Contact.phone.in_(phones)
+            )
+        ).scalars())
+        
+        rows = []
+        for row_number, contact in batch:
+            if contact.phone in existing:
+                errors.append({
+                    "row": row_number,
+                    "phone": contact.phone,
+                    "detail": f"A contact with phone number {contact.phone} already exists"
+                })
+                continue
+            existing.add(contact.phone)
+            rows.append({
+                **contact.model_dump(),
+                **search_index.normalized_fields(contact.name, contact.phone, contact.email),
+                "user_id": user_id,
+            })
+        if not rows:
+            return 0, errors
+        
+        try:
+            if _uses_fulltext(db):
+                db.execute(insert(models.Contact), rows)
+            else:
+                # RETURNING hands back the new ids, so the trigrams need no re-read
+                inserted = db.execute(insert(models.Contact).returning(
+                    models.Contact.id, models.Contact.user_id, models.Contact.name,
+                    models.Contact.phone, models.Contact.email
+                ), rows).all()
+                _index_ngrams(db, inserted)
+            _touch_user(db, user_id, len(rows))
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if attempt:
+                raise
+            continue
+        break
+    
+    search_index.index.invalidate(user_id)
+    return len(rows), errors
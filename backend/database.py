@@ -1,7 +1,15 @@
+import itertools
+import logging
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,14 +22,315 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
 
-# Create database URL
-DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Create database URL (DATABASE_URL overrides the MySQL settings above)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL, echo=True)
+# Async drivers for the same database
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its async counterpart"""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+IS_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
+
+# SQLite tuning for single-node deployments
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",          # readers never block the writer or each other
+    "PRAGMA synchronous=NORMAL",        # fsync at checkpoints only; safe with WAL
+    f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# SQLite allows one writer at a time; queue writers here instead of
+# letting them spin on SQLITE_BUSY
+_sqlite_write_lock = threading.Lock()
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+def _acquire_sqlite_writer(conn, cursor, statement, parameters, context, executemany):
+    # pysqlite opens a transaction at the first write, so that is where the lock is taken
+    if conn.info.get("sqlite_writer") or statement.lstrip()[:6].upper() in ("SELECT", "PRAGMA"):
+        return
+    _sqlite_write_lock.acquire()
+    conn.info["sqlite_writer"] = True
+
+def _release_sqlite_writer(info):
+    if info.pop("sqlite_writer", False):
+        _sqlite_write_lock.release()
+
+def configure_sqlite(engine, serialize_writes=True):
+    """Apply the SQLite pragmas to every new connection and optionally serialize writers"""
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    if not serialize_writes:
+        return
+    event.listen(engine, "before_cursor_execute", _acquire_sqlite_writer)
+    event.listen(engine, "commit", lambda conn: _release_sqlite_writer(conn.info))
+    event.listen(engine, "rollback", lambda conn: _release_sqlite_writer(conn.info))
+    # Connections returned or discarded mid-transaction must not keep the lock
+    event.listen(engine.pool, "checkin", lambda dbapi_connection, record: _release_sqlite_writer(record.info))
+    event.listen(engine.pool, "invalidate", lambda dbapi_connection, record, exc: _release_sqlite_writer(record.info))
+
+# Worker processes sharing the connection budget; serve.py exports this for its workers
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Connections all workers together may hold (MySQL max_connections minus headroom for admin tools)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "120"))
+# Share of each worker's connections given to the sync engine (threadpool routes and jobs)
+DB_SYNC_POOL_SHARE = 2 / 3
+
+def pool_limits(connections: int) -> dict:
+    """Pool settings that keep one engine within `connections` open connections"""
+    connections = max(2, connections)
+    # Half stay open between requests; overflow connections are closed when returned
+    pool_size = connections // 2
+    return {"pool_size": pool_size, "max_overflow": connections - pool_size}
+
+# Each of the two engines needs at least two connections
+MIN_WORKER_CONNECTIONS = 4
+
+_worker_connections = DB_MAX_CONNECTIONS // WEB_CONCURRENCY
+if not IS_SQLITE and _worker_connections < MIN_WORKER_CONNECTIONS:
+    # Pools cannot shrink below their minimum, so the workers together would exceed the budget
+    raise RuntimeError(
+        f"DB_MAX_CONNECTIONS={DB_MAX_CONNECTIONS} leaves {_worker_connections} connection(s) per worker "
+        f"for WEB_CONCURRENCY={WEB_CONCURRENCY}; each worker needs {MIN_WORKER_CONNECTIONS}. "
+        f"Raise DB_MAX_CONNECTIONS to at least {MIN_WORKER_CONNECTIONS * WEB_CONCURRENCY} or run fewer workers"
+    )
+SYNC_POOL = pool_limits(int(_worker_connections * DB_SYNC_POOL_SHARE))
+ASYNC_POOL = pool_limits(_worker_connections - int(_worker_connections * DB_SYNC_POOL_SHARE))
+
+# Create SQLAlchemy engine (statements are timed and slow ones logged by metrics.py)
+if IS_SQLITE:
+    # Sessions hand connections between threadpool workers
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    configure_sqlite(engine)
+else:
+    engine = create_engine(DATABASE_URL, **SYNC_POOL)
 
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay readable after commit without a reload round-trip
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Async engine for request paths that must not block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **({} if IS_SQLITE else ASYNC_POOL))
+if IS_SQLITE:
+    # Taking a threading lock would stall the event loop; async writes (sign-up,
+    # password rehash) wait on busy_timeout instead
+    configure_sqlite(async_engine.sync_engine, serialize_writes=False)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Read replicas: comma-separated URLs of servers replicating DATABASE_URL. Routes
+# that only read use them through read_session; with none configured every
+# session goes to the primary.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# After a user writes, their reads stay on the primary this long so they see
+# their own changes; keep it above the replicas' usual lag
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "5"))
+# MySQL: replicas further behind the primary than this are not used
+REPLICA_MAX_LAG_SECONDS = int(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+# Carries the pin to whichever worker serves the client's next request
+PRIMARY_PIN_COOKIE = "db_primary_until"
+
+logger = logging.getLogger("phonebook.database")
+
+class Replica:
+    """Engines and session factories for one read replica, and whether it is fit to use"""
+
+    def __init__(self, url: str):
+        self.name = make_url(url).render_as_string(hide_password=True)
+        # Each replica is a separate server with its own connection limit, so it
+        # gets the same per-worker pools as the primary
+        if make_url(url).get_backend_name() == "sqlite":
+            self.engine = create_engine(url, connect_args={"check_same_thread": False})
+            configure_sqlite(self.engine, serialize_writes=False)
+            self.async_engine = create_async_engine(to_async_url(url))
+            configure_sqlite(self.async_engine.sync_engine, serialize_writes=False)
+        else:
+            self.engine = create_engine(url, **SYNC_POOL)
+            self.async_engine = create_async_engine(to_async_url(url), **ASYNC_POOL)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine)
+        self.AsyncSessionLocal = async_sessionmaker(
+            self.async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+        self.healthy = True
+        # A dropped connection takes the replica out of rotation until the next check passes
+        for sync_engine in (self.engine, self.async_engine.sync_engine):
+            event.listen(sync_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        if context.is_disconnect:
+            self.set_healthy(False, "connection lost")
+
+    def set_healthy(self, healthy: bool, reason: str = ""):
+        if healthy != self.healthy:
+            if healthy:
+                logger.warning("replica %s is back in rotation", self.name)
+            else:
+                logger.warning("replica %s taken out of rotation: %s", self.name, reason)
+        self.healthy = healthy
+
+    def check(self):
+        """Probe the replica and update its health"""
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                lag = self._lag(conn)
+        except Exception as e:
+            self.set_healthy(False, str(e).splitlines()[0][:200])
+            return
+        if lag is not None and lag > REPLICA_MAX_LAG_SECONDS:
+            self.set_healthy(False, f"{lag}s behind the primary")
+        else:
+            self.set_healthy(True)
+
+    def _lag(self, conn) -> Optional[int]:
+        """Seconds behind the primary on MySQL; None when unknown"""
+        if self.engine.dialect.name != "mysql":
+            return None
+        for statement, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                                  ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+            try:
+                row = conn.execute(text(statement)).mappings().first()
+            except Exception:
+                # Older server, or the user lacks REPLICATION CLIENT
+                continue
+            if row is None:
+                return None
+            # NULL while replication is stopped
+            lag = row.get(column)
+            return REPLICA_MAX_LAG_SECONDS + 1 if lag is None else int(lag)
+        return None
+
+replicas: List[Replica] = [Replica(url) for url in DATABASE_REPLICA_URLS]
+_replica_turn = itertools.count()
+
+def _pick_replica() -> Optional[Replica]:
+    """Next healthy replica in round-robin order"""
+    healthy = [replica for replica in replicas if replica.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_replica_turn) % len(healthy)]
+
+def check_replicas():
+    for replica in replicas:
+        replica.check()
+
+_replica_checks_stop = threading.Event()
+
+def start_replica_checks():
+    """Check replicas now and then every REPLICA_CHECK_INTERVAL_SECONDS in a daemon thread"""
+    if not replicas:
+        return
+    check_replicas()
+    _replica_checks_stop.clear()
+
+    def run():
+        while not _replica_checks_stop.wait(REPLICA_CHECK_INTERVAL_SECONDS):
+            check_replicas()
+
+    threading.Thread(target=run, name="replica-checks", daemon=True).start()
+
+def stop_replica_checks():
+    _replica_checks_stop.set()
+
+# user id -> time.time() until which their reads go to the primary
+_primary_pins: Dict[int, float] = {}
+_primary_pins_lock = threading.Lock()
+_PRIMARY_PINS_PRUNE_AT = 10000
+# Per request: the client's pin from its cookie, and whether the request wrote
+_request_pin: ContextVar[Optional[dict]] = ContextVar("request_pin", default=None)
+
+def pin_to_primary(user_id: int):
+    """Send a user's reads to the primary for REPLICA_PIN_SECONDS after a write"""
+    if not replicas:
+        return
+    until = time.time() + REPLICA_PIN_SECONDS
+    with _primary_pins_lock:
+        if len(_primary_pins) >= _PRIMARY_PINS_PRUNE_AT:
+            now = time.time()
+            for expired in [key for key, value in _primary_pins.items() if value <= now]:
+                del _primary_pins[expired]
+        _primary_pins[user_id] = until
+    state = _request_pin.get()
+    if state is not None:
+        state["pinned_until"] = until
+
+def is_pinned(user_id: Optional[int]) -> bool:
+    now = time.time()
+    state = _request_pin.get()
+    if state is not None and state["pinned_until"] > now:
+        return True
+    return user_id is not None and _primary_pins.get(user_id, 0) > now
+
+def read_session(user_id: Optional[int] = None) -> Session:
+    """A session for reads only: on a healthy replica unless the user just wrote"""
+    replica = None if is_pinned(user_id) else _pick_replica()
+    return (replica.SessionLocal if replica is not None else SessionLocal)()
+
+def async_read_session(user_id: Optional[int] = None) -> AsyncSession:
+    replica = None if is_pinned(user_id) else _pick_replica()
+    return (replica.AsyncSessionLocal if replica is not None else AsyncSessionLocal)()
+
+class PrimaryPinMiddleware:
+    """ASGI middleware carrying a client's primary pin between workers in a cookie
+
+    Pins recorded by pin_to_primary are per process; the cookie makes the
+    client's next request read from the primary on any worker.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replicas:
+            await self.app(scope, receive, send)
+            return
+
+        initial = _cookie_pin(scope)
+        state = {"pinned_until": initial}
+        token = _request_pin.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state["pinned_until"] > initial:
+                max_age = int(state["pinned_until"] - time.time()) + 1
+                cookie = f"{PRIMARY_PIN_COOKIE}={state['pinned_until']:.3f}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = [*message.get("headers", ()), (b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_pin.reset(token)
+
+def _cookie_pin(scope) -> float:
+    """Pin time from the request's cookie, capped so a client cannot pin itself for longer"""
+    for name, value in scope.get("headers", ()):
+        if name == b"cookie":
+            for part in value.decode("latin-1").split(";"):
+                key, _, pinned_until = part.strip().partition("=")
+                if key == PRIMARY_PIN_COOKIE:
+                    try:
+                        return min(float(pinned_until), time.time() + REPLICA_PIN_SECONDS)
+                    except ValueError:
+                        return 0.0
+    return 0.0
 
 # Create Base class for models
 Base = declarative_base()
@@ -33,3 +342,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
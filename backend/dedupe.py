@@ -0,0 +1,142 @@
+import os
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import search_index
+
+load_dotenv()
+
+# Name similarity (0-100) above which two contacts are proposed as duplicates on name alone
+DEDUPE_NAME_THRESHOLD = float(os.getenv("DEDUPE_NAME_THRESHOLD", "92"))
+# Lower bar when the contacts also share a phone number or an email address
+DEDUPE_SHARED_KEY_THRESHOLD = float(os.getenv("DEDUPE_SHARED_KEY_THRESHOLD", "50"))
+# Blocks bigger than this (e.g. a very common surname) are too unselective to compare
+DEDUPE_MAX_BLOCK_SIZE = int(os.getenv("DEDUPE_MAX_BLOCK_SIZE", "1000"))
+# Blocks scored between progress callbacks
+PROGRESS_EVERY_BLOCKS = 1000
+# Trailing phone digits compared, so "+1 555..." and "555..." block together
+PHONE_SUFFIX_DIGITS = 9
+
+
+def blocking_keys(contact: search_index.IndexedContact, name_phonetic: str) -> List[str]:
+    """Keys a contact is filed under; only contacts sharing a key are compared"""
+    keys = []
+    if len(contact.phone_digits) >= 7:
+        keys.append("p:" + contact.phone_digits[-PHONE_SUFFIX_DIGITS:])
+    if contact.email_norm:
+        keys.append("e:" + contact.email_norm)
+    for code in name_phonetic.split():
+        keys.append("n:" + code)
+    return keys
+
+
+def _same_phone(a: search_index.IndexedContact, b: search_index.IndexedContact) -> bool:
+    return len(a.phone_digits) >= 7 and a.phone_digits[-PHONE_SUFFIX_DIGITS:] == b.phone_digits[-PHONE_SUFFIX_DIGITS:]
+
+
+def _pair_score(a: search_index.IndexedContact, b: search_index.IndexedContact, name_score: float) -> float:
+    """Duplicate score of a pair, or 0 if it should not be proposed"""
+    if _same_phone(a, b) or (a.email_norm and a.email_norm == b.email_norm):
+        # A shared number or address plus a similar name is strong evidence
+        if name_score >= DEDUPE_SHARED_KEY_THRESHOLD:
+            return max(name_score, 90.0)
+        return 0.0
+    return name_score if name_score >= DEDUPE_NAME_THRESHOLD else 0.0
+
+
+def _completeness(contact: search_index.IndexedContact) -> Tuple[int, int]:
+    # Most filled-in fields first, then the oldest contact
+    return (-sum(1 for value in (contact.email, contact.address) if value), contact.id)
+
+
+def find_clusters(contacts: Iterable, progress: Optional[Callable[[int, int], None]] = None) -> List[Dict]:
+    """Group a user's contacts into proposed duplicate clusters
+
+    Contacts are blocked by phone suffix, email and Soundex name tokens, and
+    names are scored pairwise with one cdist call per block, so the work grows
+    with block sizes rather than with the square of the book. Returns clusters
+    of IndexedContact entries, best first, each with a suggested primary and the
+    weakest pair score that joined it. `progress`, if given, is called with
+    (blocks scored, total blocks) as scoring advances.
+    """
+    # Imported on first use to keep worker start-up light
+    import numpy as np
+    from rapidfuzz import fuzz, process
+
+    entries = []
+    # Tokens pre-sorted once, so plain ratio gives token_sort_ratio without re-tokenizing every pair
+    sorted_names = []
+    blocks: Dict[str, List[int]] = defaultdict(list)
+    for i, contact in enumerate(contacts):
+        entry = search_index.IndexedContact(contact)
+        entries.append(entry)
+        sorted_names.append(" ".join(sorted(entry.name_norm.split())))
+        # Stored keys are used as-is; rows not yet backfilled are normalized here
+        name_phonetic = getattr(contact, "name_phonetic", None) or search_index.phonetic_key(entry.name_norm)
+        for key in blocking_keys(entry, name_phonetic):
+            blocks[key].append(i)
+
+    scores: Dict[Tuple[int, int], float] = {}
+    for done, (key, members) in enumerate(blocks.items()):
+        if progress and done % PROGRESS_EVERY_BLOCKS == 0:
+            progress(done, len(blocks))
+        if len(members) < 2 or len(members) > DEDUPE_MAX_BLOCK_SIZE:
+            continue
+        # Name blocks share nothing else, so only near-identical names can qualify there
+        cutoff = DEDUPE_NAME_THRESHOLD if key.startswith("n:") else DEDUPE_SHARED_KEY_THRESHOLD
+        names = [sorted_names[i] for i in members]
+        matrix = process.cdist(
+            names, names, scorer=fuzz.ratio, score_cutoff=cutoff, dtype=np.uint8,
+            workers=-1 if len(members) > 200 else 1,
+        )
+        # Scores under the cutoff come back as 0; upper triangle only: each pair once, no self-pairs
+        rows, cols = np.nonzero(np.triu(matrix, k=1))
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            pair = (members[r], members[c]) if members[r] < members[c] else (members[c], members[r])
+            if pair in scores:
+                continue
+            score = _pair_score(entries[pair[0]], entries[pair[1]], float(matrix[r, c]))
+            if score:
+                scores[pair] = score
+
+    if progress:
+        progress(len(blocks), len(blocks))
+
+    # Union-find over the proposed pairs
+    parent = list(range(len(entries)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in scores:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    weakest: Dict[int, float] = {}
+    for (a, b), score in scores.items():
+        root = find(a)
+        weakest[root] = min(weakest.get(root, 100.0), score)
+    for root in weakest:
+        groups[root] = []
+    for i in range(len(entries)):
+        root = find(i)
+        if root in groups:
+            groups[root].append(i)
+
+    clusters = []
+    for root, members in groups.items():
+        contacts_in_cluster = sorted((entries[i] for i in members), key=_completeness)
+        clusters.append({
+            "primary_id": contacts_in_cluster[0].id,
+            "score": round(weakest[root], 1),
+            "contacts": contacts_in_cluster,
+        })
+    clusters.sort(key=lambda cluster: (-cluster["score"], cluster["primary_id"]))
+    return clusters
@@ -0,0 +1,52 @@
+import json
+from datetime import date, datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fields of schemas.Contact, in response order; `fields=` may select any subset
+CONTACT_FIELDS = ("id", "name", "phone", "email", "address", "user_id", "created_at")
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Turn a comma-separated `fields=` value into contact field names (all when omitted)"""
+    requested = [field.strip() for field in (fields or "").split(",") if field.strip()]
+    if not requested:
+        return CONTACT_FIELDS
+    unknown = [field for field in requested if field not in CONTACT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    # Keep the canonical order so equal projections produce identical bodies
+    return tuple(field for field in CONTACT_FIELDS if field in requested)
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode plain dicts/lists with orjson, falling back to the stdlib encoder"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response for payloads already built from plain column values
+
+    Skips FastAPI's response_model validation and jsonable_encoder pass, so the
+    caller is responsible for matching the documented schema.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
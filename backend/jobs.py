@@ -0,0 +1,270 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import crud
+import dedupe
+import metrics
+import models
+import schemas
+from database import SessionLocal
+
+load_dotenv()
+
+# Jobs running at once per process; each holds one pooled connection while it runs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs allowed to wait for a worker before new submissions are refused
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "20"))
+# Queued or running jobs one user may have at a time
+JOB_MAX_ACTIVE_PER_USER = int(os.getenv("JOB_MAX_ACTIVE_PER_USER", "2"))
+# Minimum gap between progress writes to the jobs table
+JOB_PROGRESS_INTERVAL_SECONDS = float(os.getenv("JOB_PROGRESS_INTERVAL_SECONDS", "0.5"))
+# Queued or running jobs without a heartbeat for this long are reported as failed
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "900"))
+# Clusters kept in a duplicate scan's result
+DUPLICATE_REPORT_MAX_CLUSTERS = 1000
+
+ACTIVE_STATUSES = ("queued", "running")
+
+logger = logging.getLogger("phonebook.jobs")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+
+class JobContext:
+    """Handed to a running job to report progress and notice cancellation
+
+    Jobs call progress() between units of work, never inside an open write
+    transaction: it writes the jobs row through its own session.
+    """
+
+    def __init__(self, job_id: int, cancel_event: threading.Event):
+        self.job_id = job_id
+        self._cancel_event = cancel_event
+        self.processed = 0
+        self.total = None
+        self._last_write = 0.0
+
+    def progress(self, processed: int, total: Optional[int] = None):
+        """Record progress and raise JobCancelled if the job should stop"""
+        self.processed = processed
+        if total is not None:
+            self.total = total
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        now = time.monotonic()
+        if now - self._last_write < JOB_PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_write = now
+        values = {"processed": self.processed, "updated_at": datetime.now(timezone.utc)}
+        if self.total is not None:
+            values["total"] = self.total
+        db = SessionLocal()
+        try:
+            db.execute(update(models.Job).where(models.Job.id == self.job_id).values(values))
+            # Another worker process may have taken the cancel request
+            cancel_requested = db.query(models.Job.cancel_requested).filter(models.Job.id == self.job_id).scalar()
+            db.commit()
+        finally:
+            db.close()
+        if cancel_requested:
+            self._cancel_event.set()
+            raise JobCancelled()
+
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_slots = threading.BoundedSemaphore(JOB_WORKERS + JOB_MAX_PENDING)
+# Cancel flags of the jobs queued or running in this process
+_cancel_events: Dict[int, threading.Event] = {}
+_cancel_events_lock = threading.Lock()
+
+
+def _set_job(job_id: int, *conditions, **values) -> bool:
+    """Update a job row in its own transaction; False if the conditions no longer hold"""
+    values.setdefault("updated_at", datetime.now(timezone.utc))
+    db = SessionLocal()
+    try:
+        updated = db.execute(
+            update(models.Job).where(models.Job.id == job_id, *conditions).values(values)
+        ).rowcount
+        db.commit()
+        return updated > 0
+    finally:
+        db.close()
+
+
+def _run(job_id: int, kind: str, user_id: int, fn: Callable, args: tuple, cancel_event: threading.Event):
+    started = time.perf_counter()
+    outcome = "cancelled"
+    try:
+        # A job reported stale or cancelled while it waited is not started
+        if cancel_event.is_set() or not _set_job(
+            job_id, models.Job.status == "queued", models.Job.cancel_requested.is_(False),
+            status="running", started_at=datetime.now(timezone.utc),
+        ):
+            _set_job(job_id, models.Job.status == "queued", status="cancelled", finished_at=datetime.now(timezone.utc))
+            return
+        db = SessionLocal()
+        try:
+            context = JobContext(job_id, cancel_event)
+            result = fn(db, user_id, context, *args)
+            outcome = "succeeded"
+            # Progress writes are throttled, so the final count is written here
+            _set_job(
+                job_id, status="succeeded", result=result, processed=context.processed, total=context.total,
+                finished_at=datetime.now(timezone.utc),
+            )
+        except JobCancelled:
+            # Chunks committed before the request stay applied
+            db.rollback()
+            _set_job(job_id, status="cancelled", finished_at=datetime.now(timezone.utc))
+        except Exception as e:
+            db.rollback()
+            outcome = "failed"
+            logger.exception("job %s (%s) failed", job_id, kind)
+            error = e.detail if isinstance(e, HTTPException) else "Internal error"
+            _set_job(job_id, status="failed", error=str(error)[:500], finished_at=datetime.now(timezone.utc))
+        finally:
+            db.close()
+    finally:
+        metrics.JOB_SECONDS.labels(kind, outcome).observe(time.perf_counter() - started)
+        with _cancel_events_lock:
+            _cancel_events.pop(job_id, None)
+        _slots.release()
+
+
+def submit(db: Session, user_id: int, kind: str, fn: Callable, *args) -> models.Job:
+    """Record a job and queue fn(db, user_id, context, *args) on the worker pool
+
+    fn gets its own session and returns a JSON-serializable result.
+    """
+    active = db.query(models.Job).filter(
+        models.Job.user_id == user_id, models.Job.status.in_(ACTIVE_STATUSES)
+    ).all()
+    if sum(1 for job in active if not _mark_if_stale(db, job)) >= JOB_MAX_ACTIVE_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many jobs in progress, wait for one to finish",
+        )
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "5"},
+        )
+    try:
+        job = models.Job(user_id=user_id, kind=kind, status="queued")
+        db.add(job)
+        db.commit()
+        cancel_event = threading.Event()
+        with _cancel_events_lock:
+            _cancel_events[job.id] = cancel_event
+        _executor.submit(_run, job.id, kind, user_id, fn, args, cancel_event)
+    except BaseException:
+        _slots.release()
+        raise
+    return job
+
+
+def _mark_if_stale(db: Session, job: models.Job) -> bool:
+    """Fail a queued or running job whose worker stopped sending heartbeats"""
+    if job.status not in ACTIVE_STATUSES or job.id in _cancel_events:
+        return False
+    updated_at = job.updated_at if job.updated_at.tzinfo else job.updated_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - updated_at < timedelta(seconds=JOB_STALE_SECONDS):
+        return False
+    if not _set_job(job.id, models.Job.status == job.status,
+                    status="failed", error="Interrupted before finishing", finished_at=datetime.now(timezone.utc)):
+        return False
+    db.refresh(job)
+    return True
+
+
+def get_job(db: Session, user_id: int, job_id: int) -> models.Job:
+    job = db.query(models.Job).filter(models.Job.id == job_id, models.Job.user_id == user_id).first()
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    _mark_if_stale(db, job)
+    return job
+
+
+def list_jobs(db: Session, user_id: int, limit: int = 20) -> List[models.Job]:
+    jobs = db.query(models.Job).filter(models.Job.user_id == user_id).order_by(
+        models.Job.created_at.desc(), models.Job.id.desc()
+    ).limit(limit).all()
+    for job in jobs:
+        _mark_if_stale(db, job)
+    return jobs
+
+
+def cancel(db: Session, user_id: int, job_id: int) -> models.Job:
+    """Ask a job to stop at its next progress point; finished jobs are returned unchanged"""
+    job = get_job(db, user_id, job_id)
+    if job.status in ACTIVE_STATUSES:
+        _set_job(job_id, models.Job.status.in_(ACTIVE_STATUSES), cancel_requested=True)
+        with _cancel_events_lock:
+            cancel_event = _cancel_events.get(job_id)
+        if cancel_event is not None:
+            cancel_event.set()
+        db.refresh(job)
+    return job
+
+
+def shutdown():
+    """Stop taking jobs and ask running ones to stop; their rows go stale and are reported failed"""
+    with _cancel_events_lock:
+        for cancel_event in _cancel_events.values():
+            cancel_event.set()
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Job kinds
+
+def find_duplicates_job(db: Session, user_id: int, context: JobContext) -> Dict:
+    clusters = dedupe.find_clusters(crud.get_dedupe_contacts(db, user_id), progress=context.progress)
+    # The scan only reads; end the read transaction before the final write
+    db.rollback()
+    return {
+        "total": len(clusters),
+        "clusters": [
+            {"primary_id": cluster["primary_id"], "score": cluster["score"],
+             "contact_ids": [contact.id for contact in cluster["contacts"]]}
+            for cluster in clusters[:DUPLICATE_REPORT_MAX_CLUSTERS]
+        ],
+    }
+
+
+def merge_contacts_job(db: Session, user_id: int, context: JobContext, clusters: List[schemas.MergeCluster]) -> Dict:
+    context.progress(0, len(clusters))
+    outcomes = crud.merge_contacts(db, user_id, clusters, progress=context.progress)
+    return {"merged": sum(1 for outcome in outcomes if outcome["status"] == "merged"), "results": outcomes}
+
+
+def _batch_summary(outcomes: List[Dict]) -> Dict:
+    # Per-id results for thousands of ids would bloat the job row; only failures are listed
+    not_found = [outcome["id"] for outcome in outcomes if outcome["status"] == "not_found"]
+    return {"succeeded": len(outcomes) - len(not_found), "failed": len(not_found), "not_found_ids": not_found}
+
+
+def delete_contacts_job(db: Session, user_id: int, context: JobContext, selection: schemas.ContactBatchSelection) -> Dict:
+    context.progress(0, len(set(selection.ids)) if selection.ids is not None else None)
+    return _batch_summary(crud.delete_contacts(db, user_id, selection, progress=context.progress))
+
+
+def update_contacts_job(
+    db: Session, user_id: int, context: JobContext,
+    selection: schemas.ContactBatchSelection, changes: schemas.ContactBatchChanges
+) -> Dict:
+    context.progress(0, len(set(selection.ids)) if selection.ids is not None else None)
+    return _batch_summary(crud.update_contacts(db, user_id, selection, changes, progress=context.progress))
@@ -1,19 +1,52 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import models
-from database import engine
+import database
+from database import engine, async_engine
+import metrics
+import jobs
 import routes
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Creating tables inspects every table over the network, so workers skip it unless asked;
+# `python main.py` turns it on for local development
+CREATE_TABLES_ON_STARTUP = os.getenv("CREATE_TABLES_ON_STARTUP", "0") == "1"
+
+def create_tables():
+    """Create any missing tables"""
+    models.Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Worker startup and shutdown"""
+    if CREATE_TABLES_ON_STARTUP:
+        create_tables()
+    database.start_replica_checks()
+    try:
+        yield
+    finally:
+        jobs.shutdown()
+        database.stop_replica_checks()
 
 # Create FastAPI app
 app = FastAPI(
     title="Phonebook API",
     description="A simple phonebook API for managing contacts",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Per-route latency and SQL statement metrics, served at /metrics
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(async_engine.sync_engine, "async")
+for number, replica in enumerate(database.replicas, 1):
+    metrics.instrument_engine(replica.engine, f"replica{number}")
+    metrics.instrument_engine(replica.async_engine.sync_engine, f"replica{number}_async")
+app.add_middleware(metrics.MetricsMiddleware)
+# Keeps a client's reads on the primary for a moment after it writes, on any worker
+app.add_middleware(database.PrimaryPinMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -29,15 +62,8 @@ app.add_middleware(
 )
 
 # Include routers
-# Include routers
-# Include routers
-print("DEBUG: Including routes router...")
 app.include_router(routes.router, prefix="/api")
 
-print("DEBUG: Registered Routes:")
-for route in app.routes:
-    print(f"DEBUG: {route.path} [{route.methods}]")
-
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Phonebook API1"}
@@ -46,6 +72,11 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
 @app.post("/api/2fa/setup")
 def test_2fa_setup():
     return {"message": "2FA setup endpoint is working!", "secret": "TEST123", "uri": "otpauth://totp/test"}
@@ -53,4 +84,6 @@ def test_2fa_setup():
 
 if __name__ == "__main__":
     import uvicorn
+    # Inherited by the reloader's server process
+    os.environ.setdefault("CREATE_TABLES_ON_STARTUP", "1")
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,199 @@
+import contextvars
+import logging
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+load_dotenv()
+
+# Statements slower than this are logged; 0 logs every statement
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Fraction of slow statements that are actually written to the log
+SLOW_QUERY_LOG_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_LOG_SAMPLE_RATE", "1.0"))
+
+slow_query_logger = logging.getLogger("phonebook.slow_query")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ["method", "route", "status"],
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements issued per request",
+    ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 500),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request",
+    ["route"],
+)
+DB_STATEMENT_SECONDS = Histogram(
+    "db_statement_duration_seconds", "SQL statement latency",
+    ["engine", "operation"],
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds", "Time spent acquiring a connection from the pool",
+    ["engine"], buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_HOLD_SECONDS = Histogram(
+    "db_pool_connection_hold_seconds", "Time a connection stays checked out of the pool",
+    ["engine"], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts", "Connections checked out of the pool", ["engine"],
+)
+# Connections beyond pool_size are opened per checkout and closed on return
+DB_POOL_OVERFLOW_CHECKOUTS = Counter(
+    "db_pool_overflow_checkouts", "Checkouts made with more connections in use than the pool size", ["engine"],
+)
+SEARCH_SCORING_SECONDS = Histogram(
+    "search_scoring_seconds", "RapidFuzz scoring time in /api/search",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "bcrypt time on the hashing pool", ["operation"],
+)
+JOB_SECONDS = Histogram(
+    "job_duration_seconds", "Background job run time", ["kind", "status"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+
+
+class RequestStats:
+    """SQL work attributed to the current request"""
+
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+# Threadpool and greenlet calls copy the context, so they all update the same object
+_request_stats: contextvars.ContextVar = contextvars.ContextVar("request_stats", default=None)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and SQL work"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            # Route templates keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status_code)).observe(elapsed)
+            REQUEST_DB_STATEMENTS.labels(route).observe(stats.statements)
+            REQUEST_DB_SECONDS.labels(route).observe(stats.db_seconds)
+
+
+def instrument_engine(engine, name: str):
+    """Attach statement timing, the slow-query log and pool metrics to a sync Engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_STATEMENT_SECONDS.labels(name, operation).observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS and random.random() < SLOW_QUERY_LOG_SAMPLE_RATE:
+            slow_query_logger.warning("slow query (%.1f ms) on %s: %s", elapsed * 1000, name, statement)
+
+    pool = engine.pool
+    is_queue_pool = isinstance(pool, QueuePool)
+    connect = pool.connect
+
+    def _timed_connect():
+        # Engine.connect() acquires through here: queueing for a free connection
+        # and opening a new one both count, as does a wait that times out
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+    pool.connect = _timed_connect
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.labels(name).inc()
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        # The connection just handed out is already counted
+        if is_queue_pool and pool.checkedout() > pool.size():
+            DB_POOL_OVERFLOW_CHECKOUTS.labels(name).inc()
+
+    @event.listens_for(pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            DB_POOL_HOLD_SECONDS.labels(name).observe(time.perf_counter() - checked_out_at)
+
+    if is_queue_pool:
+        _pool_collector.pools.append((name, pool))
+
+
+class _PoolCollector:
+    """Reports pool occupancy at scrape time"""
+
+    def __init__(self):
+        self.pools = []
+
+    def collect(self):
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"]),
+            "checkedout": GaugeMetricFamily("db_pool_checked_out", "Connections currently in use", labels=["engine"]),
+            "checkedin": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["engine"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections opened beyond the pool size", labels=["engine"]),
+        }
+        for name, pool in self.pools:
+            for method, family in gauges.items():
+                # QueuePool.overflow() counts up from -pool_size
+                family.add_metric([name], max(getattr(pool, method)(), 0))
+        return list(gauges.values())
+
+
+_pool_collector = _PoolCollector()
+REGISTRY.register(_pool_collector)
+
+
+def render():
+    """Current metrics in the Prometheus text format, with its content type"""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    # Under serve.py every worker writes its samples to the shared directory and
+    # any worker can answer the scrape with the sum; pool gauges are the scraped worker's own
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_pool_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
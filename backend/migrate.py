@@ -0,0 +1,579 @@
+"""Versioned, online schema migrations.
+
+    python migrate.py status
+    python migrate.py up [--to VERSION] [--dry-run]
+    python migrate.py baseline VERSION
+    python migrate.py backfill {search_keys,contact_counts,ngrams} [--all] [--after-id ID]
+    python migrate.py reset --yes
+
+Each migration is a list of steps. Schema steps look at the live schema first
+and are skipped when their change is already there, so a database built by
+create_all or by the old one-off scripts can run every migration. On MySQL
+they use online DDL (ALGORITHM=INSTANT/INPLACE, LOCK=NONE) with a short
+lock_wait_timeout, so an ALTER never queues behind a long transaction while
+holding up the traffic behind it.
+
+Data steps walk a table's primary key in ranges, with one short transaction
+per chunk. Chunks grow or shrink to take about MIGRATION_CHUNK_SECONDS. After
+each chunk the runner sleeps for MIGRATION_THROTTLE times as long as the chunk
+took, which leaves most of the database to live traffic. The resume point is
+committed with every chunk, so an interrupted run carries on where it stopped.
+
+`up --dry-run` prints each pending step with its SQL or an estimate of the
+rows and chunks it will touch, without changing anything.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, delete, exists, func, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session, aliased
+
+import crud
+import models
+import search_index
+from database import SessionLocal, engine
+
+load_dotenv()
+
+# Starting rows per chunk; adjusted while running to stay near MIGRATION_CHUNK_SECONDS
+MIGRATION_CHUNK_SIZE = int(os.getenv("MIGRATION_CHUNK_SIZE", "1000"))
+MIGRATION_MAX_CHUNK_SIZE = int(os.getenv("MIGRATION_MAX_CHUNK_SIZE", "20000"))
+MIGRATION_CHUNK_SECONDS = float(os.getenv("MIGRATION_CHUNK_SECONDS", "0.5"))
+# Pause after each chunk, as a multiple of the time the chunk took
+MIGRATION_THROTTLE = float(os.getenv("MIGRATION_THROTTLE", "1.0"))
+# MySQL: how long an ALTER waits for its metadata lock before backing off and retrying
+MIGRATION_LOCK_WAIT_SECONDS = int(os.getenv("MIGRATION_LOCK_WAIT_SECONDS", "5"))
+MIGRATION_DDL_ATTEMPTS = 10
+MIN_CHUNK_SIZE = 100
+
+IS_MYSQL = engine.dialect.name == "mysql"
+# MySQL ER_LOCK_WAIT_TIMEOUT
+LOCK_WAIT_TIMEOUT = 1205
+
+
+class MigrationError(Exception):
+    pass
+
+
+def _inspector():
+    # A fresh inspector per check; they cache what they have read
+    return inspect(engine)
+
+
+def _has_table(table: str) -> bool:
+    return _inspector().has_table(table)
+
+
+def _columns(table: str) -> Optional[set]:
+    # A table still to be created gets its columns and indexes from the model
+    if not _has_table(table):
+        return None
+    return {column["name"] for column in _inspector().get_columns(table)}
+
+
+def _indexes(table: str) -> Optional[set]:
+    if not _has_table(table):
+        return None
+    inspector = _inspector()
+    names = {index["name"] for index in inspector.get_indexes(table)}
+    # SQLite reports constraints declared in CREATE TABLE separately
+    names.update(constraint["name"] for constraint in inspector.get_unique_constraints(table) if constraint["name"])
+    return names
+
+
+def _execute_ddl(*statements: str):
+    """Run DDL, retrying when MySQL cannot get the metadata lock quickly"""
+    for attempt in range(1, MIGRATION_DDL_ATTEMPTS + 1):
+        try:
+            with engine.begin() as conn:
+                if IS_MYSQL:
+                    conn.execute(text(f"SET SESSION lock_wait_timeout = {MIGRATION_LOCK_WAIT_SECONDS}"))
+                for statement in statements:
+                    conn.execute(text(statement))
+            return
+        except OperationalError as e:
+            if getattr(e.orig, "errno", None) != LOCK_WAIT_TIMEOUT or attempt == MIGRATION_DDL_ATTEMPTS:
+                raise
+            print(f"[INFO] Metadata lock busy, retrying in {attempt}s...")
+            time.sleep(attempt)
+
+
+class Step:
+    """One unit of a migration"""
+
+    # Steps to go back when this one fails, so a rerun repeats them
+    rewind_on_failure = 0
+
+    def describe(self) -> Optional[str]:
+        """What the step would do now, or None if there is nothing to do"""
+        raise NotImplementedError
+
+    def apply(self, runner: "Runner"):
+        raise NotImplementedError
+
+
+class CreateTables(Step):
+    """Create the models' tables that do not exist yet; existing tables are left alone"""
+
+    def __init__(self, *model_classes):
+        self.tables = [model.__table__ for model in model_classes]
+
+    def _missing(self):
+        return [table for table in self.tables if not _has_table(table.name)]
+
+    def describe(self):
+        missing = self._missing()
+        return f"create table(s) {', '.join(table.name for table in missing)}" if missing else None
+
+    def apply(self, runner):
+        models.Base.metadata.create_all(bind=engine, tables=self._missing())
+
+
+class AddColumn(Step):
+    def __init__(self, table: str, column: str, definition: str):
+        self.table, self.column, self.definition = table, column, definition
+
+    def describe(self):
+        columns = _columns(self.table)
+        if columns is None or self.column in columns:
+            return None
+        return f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.definition}"
+
+    def apply(self, runner):
+        statement = f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.definition}"
+        if not IS_MYSQL:
+            _execute_ddl(statement)
+            return
+        try:
+            # Metadata-only on MySQL 8.0.12+
+            _execute_ddl(statement + ", ALGORITHM=INSTANT")
+        except OperationalError:
+            _execute_ddl(statement + ", ALGORITHM=INPLACE, LOCK=NONE")
+
+
+class AddIndex(Step):
+    def __init__(self, table: str, name: str, columns: List[str], unique: bool = False,
+                 fulltext: bool = False, rewind_on_failure: int = 0):
+        self.table, self.name, self.columns = table, name, columns
+        self.unique, self.fulltext = unique, fulltext
+        self.rewind_on_failure = rewind_on_failure
+
+    def _statement(self) -> str:
+        columns = ", ".join(self.columns)
+        if not IS_MYSQL:
+            return f"CREATE {'UNIQUE ' if self.unique else ''}INDEX {self.name} ON {self.table} ({columns})"
+        if self.fulltext:
+            # InnoDB cannot build a FULLTEXT index under concurrent writes; reads continue
+            return (f"ALTER TABLE {self.table} ADD FULLTEXT INDEX {self.name} ({columns}) WITH PARSER ngram, "
+                    f"ALGORITHM=INPLACE, LOCK=SHARED")
+        return (f"ALTER TABLE {self.table} ADD {'UNIQUE ' if self.unique else ''}INDEX {self.name} ({columns}), "
+                f"ALGORITHM=INPLACE, LOCK=NONE")
+
+    def describe(self):
+        indexes = _indexes(self.table)
+        if (self.fulltext and not IS_MYSQL) or indexes is None or self.name in indexes:
+            return None
+        return self._statement()
+
+    def apply(self, runner):
+        try:
+            _execute_ddl(self._statement())
+        except IntegrityError:
+            raise MigrationError(
+                f"{self.name}: duplicate rows were written after the cleanup pass; run `migrate.py up` again"
+            )
+
+
+class DropIndex(Step):
+    def __init__(self, table: str, name: str):
+        self.table, self.name = table, name
+
+    def _statement(self) -> str:
+        if IS_MYSQL:
+            return f"ALTER TABLE {self.table} DROP INDEX {self.name}, ALGORITHM=INPLACE, LOCK=NONE"
+        return f"DROP INDEX {self.name}"
+
+    def describe(self):
+        return self._statement() if self.name in (_indexes(self.table) or ()) else None
+
+    def apply(self, runner):
+        _execute_ddl(self._statement())
+
+
+class ChunkedPass(Step):
+    """Run process(db, lo, hi) over primary-key ranges [lo, hi) of a table
+
+    process handles the rows in its range (all of them or only those still
+    pending) and returns how many it changed. It must be idempotent: a chunk
+    that was cut off before its resume point was committed runs again.
+    """
+
+    def __init__(self, description: str, model, process: Callable[[Session, int, int], int],
+                 skip_dialects: tuple = ()):
+        self.description, self.model, self.process = description, model, process
+        self.skip_dialects = skip_dialects
+
+    def applies(self) -> bool:
+        return engine.dialect.name not in self.skip_dialects
+
+    def estimate(self, after_id: int = 0) -> str:
+        table = self.model.__tablename__
+        if not _has_table(table):
+            return "no rows"
+        with engine.connect() as conn:
+            low, high = conn.execute(
+                select(func.min(self.model.id), func.max(self.model.id)).where(self.model.id > after_id)
+            ).one()
+            if low is None:
+                return "no rows"
+            if IS_MYSQL:
+                # The optimizer's estimate; an exact COUNT(*) would scan the table
+                total = conn.scalar(text(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+                ), {"table": table}) or 0
+                overall = conn.execute(select(func.min(self.model.id), func.max(self.model.id))).one()
+                rows = int(total * (high - low + 1) / max(1, overall[1] - overall[0] + 1))
+            else:
+                rows = conn.scalar(select(func.count()).select_from(self.model).where(self.model.id > after_id))
+        chunks = -(-(high - low + 1) // MIGRATION_CHUNK_SIZE)
+        return f"~{rows} row(s) of {table} in ids {low}..{high}, ~{chunks} chunk(s) of {MIGRATION_CHUNK_SIZE}"
+
+    def describe(self, after_id: int = 0):
+        if not self.applies():
+            return None
+        return f"{self.description}: {self.estimate(after_id)}"
+
+    def apply(self, runner):
+        if self.applies():
+            runner.run_chunks(self)
+
+
+class Migration:
+    def __init__(self, version: int, name: str, steps: List[Step]):
+        self.version, self.name, self.steps = version, name, steps
+
+
+# Data passes
+
+def search_keys_pass(recompute_all: bool = False) -> Callable[[Session, int, int], int]:
+    """Fill name_norm, phone_digits, email_norm and name_phonetic (all rows with recompute_all)"""
+    def process(db: Session, lo: int, hi: int) -> int:
+        stmt = select(models.Contact.id, models.Contact.name, models.Contact.phone, models.Contact.email).where(
+            models.Contact.id >= lo, models.Contact.id < hi
+        )
+        if not recompute_all:
+            stmt = stmt.where(models.Contact.name_norm.is_(None))
+        rows = db.execute(stmt).all()
+        if rows:
+            # Matched on the values the keys were computed from (and, for a fill, on the keys still
+            # being empty): a contact edited since the SELECT already has fresh keys from crud
+            guard = update(models.Contact).where(
+                models.Contact.id == bindparam("row_id"),
+                models.Contact.name == bindparam("row_name"),
+                models.Contact.phone == bindparam("row_phone"),
+                models.Contact.email.is_not_distinct_from(bindparam("row_email")),
+            )
+            if not recompute_all:
+                guard = guard.where(models.Contact.name_norm.is_(None))
+            db.connection().execute(guard, [
+                {"row_id": row.id, "row_name": row.name, "row_phone": row.phone, "row_email": row.email,
+                 **search_index.normalized_fields(row.name, row.phone, row.email)}
+                for row in rows
+            ])
+        return len(rows)
+    return process
+
+
+def contact_counts_pass(db: Session, lo: int, hi: int) -> int:
+    """Recompute users.contact_count for a range of users"""
+    user_ids = db.scalars(select(models.User.id).where(models.User.id >= lo, models.User.id < hi)).all()
+    return crud.reconcile_contact_counts(db, user_ids) if user_ids else 0
+
+
+def ngrams_pass(recompute_all: bool = False) -> Callable[[Session, int, int], int]:
+    """Write contact_ngrams rows for contacts that have none (all contacts with recompute_all)"""
+    def process(db: Session, lo: int, hi: int) -> int:
+        stmt = select(
+            models.Contact.id, models.Contact.user_id, models.Contact.name, models.Contact.phone, models.Contact.email
+        ).where(models.Contact.id >= lo, models.Contact.id < hi)
+        if not recompute_all:
+            stmt = stmt.where(~exists().where(models.ContactNgram.contact_id == models.Contact.id))
+        rows = db.execute(stmt).all()
+        crud._index_ngrams(db, rows, replace=recompute_all)
+        return len(rows)
+    return process
+
+
+def duplicate_phones_pass(db: Session, lo: int, hi: int) -> int:
+    """Delete contacts whose (user_id, phone) already belongs to a contact with a lower id"""
+    earlier = aliased(models.Contact)
+    doomed = db.execute(
+        select(models.Contact.id, models.Contact.user_id).where(
+            models.Contact.id >= lo, models.Contact.id < hi,
+            exists().where(
+                earlier.user_id == models.Contact.user_id,
+                earlier.phone == models.Contact.phone,
+                earlier.id < models.Contact.id,
+            ),
+        )
+    ).all()
+    if not doomed:
+        return 0
+    ids = [row.id for row in doomed]
+    db.execute(delete(models.ContactNgram).where(models.ContactNgram.contact_id.in_(ids)))
+    db.execute(delete(models.Contact).where(models.Contact.id.in_(ids)))
+    # Commits the chunk along with the corrected counters
+    crud.reconcile_contact_counts(db, sorted({row.user_id for row in doomed}))
+    return len(ids)
+
+
+BACKFILLS = {
+    "search_keys": lambda recompute_all: ChunkedPass(
+        "backfill contact search keys", models.Contact, search_keys_pass(recompute_all)),
+    "contact_counts": lambda recompute_all: ChunkedPass(
+        "recompute users.contact_count", models.User, contact_counts_pass),
+    # MySQL prefilters with its FULLTEXT index instead
+    "ngrams": lambda recompute_all: ChunkedPass(
+        "index contact trigrams", models.Contact, ngrams_pass(recompute_all), skip_dialects=("mysql",)),
+}
+
+
+MIGRATIONS = [
+    Migration(1, "create missing tables", [
+        CreateTables(models.User, models.Contact, models.ContactNgram, models.Job),
+    ]),
+    Migration(2, "user contact counter and data version", [
+        AddColumn("users", "contact_count", "INTEGER NOT NULL DEFAULT 0"),
+        AddColumn("users", "data_version", "INTEGER NOT NULL DEFAULT 0"),
+        BACKFILLS["contact_counts"](False),
+    ]),
+    Migration(3, "phone numbers unique per user", [
+        # Added by the old update_schema.py script; they made phones and emails unique across all users
+        DropIndex("contacts", "unique_phone"),
+        DropIndex("contacts", "unique_email"),
+        ChunkedPass("delete duplicate (user_id, phone) contacts, keeping the oldest", models.Contact,
+                    duplicate_phones_pass),
+        # Contacts written during the pass can bring duplicates back; a failure rewinds to the pass
+        AddIndex("contacts", "uq_user_phone", ["user_id", "phone"], unique=True, rewind_on_failure=1),
+    ]),
+    Migration(4, "keyset pagination index", [
+        AddIndex("contacts", "ix_contacts_user_name_id", ["user_id", "name", "id"]),
+    ]),
+    Migration(5, "search prefilter", [
+        AddIndex("contacts", "ft_contacts_search", ["name", "phone", "email"], fulltext=True),
+        BACKFILLS["ngrams"](False),
+    ]),
+    Migration(6, "normalized search keys", [
+        AddColumn("contacts", "name_norm", "VARCHAR(100) NULL"),
+        AddColumn("contacts", "phone_digits", "VARCHAR(20) NULL"),
+        AddColumn("contacts", "email_norm", "VARCHAR(100) NULL"),
+        AddColumn("contacts", "name_phonetic", "VARCHAR(20) NULL"),
+        # Filled before indexing, so the index build does not absorb every update
+        BACKFILLS["search_keys"](False),
+        AddIndex("contacts", "ix_contacts_user_name_norm", ["user_id", "name_norm"]),
+        AddIndex("contacts", "ix_contacts_user_phone_digits", ["user_id", "phone_digits"]),
+        AddIndex("contacts", "ix_contacts_user_email_norm", ["user_id", "email_norm"]),
+        AddIndex("contacts", "ix_contacts_user_name_phonetic", ["user_id", "name_phonetic"]),
+    ]),
+]
+
+
+class Runner:
+    def __init__(self, db: Session):
+        self.db = db
+        self.record: Optional[models.SchemaMigration] = None
+
+    def records(self) -> dict:
+        if not _has_table(models.SchemaMigration.__tablename__):
+            return {}
+        records = {record.version: record for record in self.db.query(models.SchemaMigration)}
+        # End the read so no transaction is open while DDL runs
+        self.db.commit()
+        return records
+
+    def run_chunks(self, step: ChunkedPass, after_id: Optional[int] = None):
+        """Walk step.model's primary key from the resume point, committing it with each chunk"""
+        db = self.db
+        last_id = self.record.last_id if after_id is None else after_id
+        # Rows inserted later are written by code that already maintains the new data
+        max_id = db.scalar(select(func.max(step.model.id))) or 0
+        size = MIGRATION_CHUNK_SIZE
+        changed = 0
+        print(f"[INFO] {step.description}: ids {last_id + 1}..{max_id}")
+        while last_id < max_id:
+            started = time.perf_counter()
+            hi = min(last_id + 1 + size, max_id + 1)
+            changed += step.process(db, last_id + 1, hi)
+            last_id = hi - 1
+            if self.record is not None:
+                self.record.last_id = last_id
+            db.commit()
+            elapsed = time.perf_counter() - started
+            print(f"[INFO]   up to id {last_id}: {changed} row(s) changed, chunk of {size} in {elapsed:.2f}s")
+            if elapsed > MIGRATION_CHUNK_SECONDS:
+                size = max(MIN_CHUNK_SIZE, size // 2)
+            elif elapsed < MIGRATION_CHUNK_SECONDS / 2:
+                size = min(MIGRATION_MAX_CHUNK_SIZE, size * 2)
+            time.sleep(elapsed * MIGRATION_THROTTLE)
+        print(f"[SUCCESS] {step.description}: {changed} row(s) changed")
+
+    def up(self, target: Optional[int] = None):
+        models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+        records = self.records()
+        for migration in MIGRATIONS:
+            if target is not None and migration.version > target:
+                break
+            record = records.get(migration.version)
+            if record is not None and record.status == "applied":
+                continue
+            if record is None:
+                record = models.SchemaMigration(version=migration.version, name=migration.name, status="running")
+                self.db.add(record)
+                self.db.commit()
+            self.record = record
+            print(f"[INFO] Migration {migration.version}: {migration.name}")
+            while record.step < len(migration.steps):
+                step = migration.steps[record.step]
+                if isinstance(step, ChunkedPass) or step.describe() is not None:
+                    try:
+                        step.apply(self)
+                    except Exception:
+                        self.db.rollback()
+                        if step.rewind_on_failure:
+                            record.step -= step.rewind_on_failure
+                            record.last_id = 0
+                            self.db.commit()
+                        raise
+                record.step += 1
+                record.last_id = 0
+                self.db.commit()
+            record.status = "applied"
+            record.applied_at = datetime.now(timezone.utc)
+            self.db.commit()
+            print(f"[SUCCESS] Migration {migration.version} applied")
+
+    def plan(self, target: Optional[int] = None):
+        """Print what `up` would do, without changing anything"""
+        records = self.records()
+        pending = False
+        for migration in MIGRATIONS:
+            if target is not None and migration.version > target:
+                break
+            record = records.get(migration.version)
+            if record is not None and record.status == "applied":
+                continue
+            pending = True
+            first_step = record.step if record is not None else 0
+            print(f"[INFO] Migration {migration.version}: {migration.name}")
+            for index, step in enumerate(migration.steps[first_step:], first_step):
+                if isinstance(step, ChunkedPass):
+                    resume = record.last_id if record is not None and index == first_step else 0
+                    action = step.describe(resume)
+                else:
+                    action = step.describe()
+                print(f"  - {action}" if action else "  - (already in place)")
+        if not pending:
+            print("[INFO] No pending migrations")
+
+    def status(self):
+        records = self.records()
+        for migration in MIGRATIONS:
+            record = records.get(migration.version)
+            if record is None:
+                state = "pending"
+            elif record.status == "applied":
+                state = f"applied {record.applied_at:%Y-%m-%d %H:%M}"
+            else:
+                state = f"interrupted at step {record.step + 1}/{len(migration.steps)}, after id {record.last_id}"
+            print(f"  {migration.version:>4}  {migration.name:<45} {state}")
+
+    def baseline(self, version: int):
+        """Record migrations up to `version` as applied without running them"""
+        models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+        records = self.records()
+        for migration in MIGRATIONS:
+            if migration.version > version:
+                break
+            record = records.get(migration.version) or models.SchemaMigration(
+                version=migration.version, name=migration.name
+            )
+            record.status = "applied"
+            record.step = len(migration.steps)
+            record.applied_at = datetime.now(timezone.utc)
+            self.db.add(record)
+        self.db.commit()
+        print(f"[SUCCESS] Marked migrations up to {version} as applied")
+
+
+def _acquire_lock(conn) -> bool:
+    """One runner at a time per MySQL database; SQLite serializes writers itself"""
+    if not IS_MYSQL:
+        return True
+    return conn.scalar(text("SELECT GET_LOCK('phonebook_migrate', 0)")) == 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list migrations and their state")
+    up = commands.add_parser("up", help="apply pending migrations")
+    up.add_argument("--to", type=int, help="stop after this version")
+    up.add_argument("--dry-run", action="store_true", help="print the pending steps and row estimates only")
+    baseline = commands.add_parser("baseline", help="mark migrations as applied without running them")
+    baseline.add_argument("version", type=int)
+    backfill = commands.add_parser("backfill", help="run one data pass on its own, e.g. after changing normalization")
+    backfill.add_argument("name", choices=sorted(BACKFILLS))
+    backfill.add_argument("--all", action="store_true", help="recompute every row, not only missing values")
+    backfill.add_argument("--after-id", type=int, default=0, help="resume after this primary key")
+    backfill.add_argument("--dry-run", action="store_true", help="print the row estimate only")
+    reset = commands.add_parser("reset", help="drop every table (development only)")
+    reset.add_argument("--yes", action="store_true", help="confirm dropping all data")
+    args = parser.parse_args()
+
+    print(f"[INFO] Database {engine.url.render_as_string(hide_password=True)}")
+    db = SessionLocal()
+    lock_conn = engine.connect()
+    try:
+        if not _acquire_lock(lock_conn):
+            print("[ERROR] Another migration run holds the lock")
+            sys.exit(1)
+        runner = Runner(db)
+        if args.command == "status":
+            runner.status()
+        elif args.command == "up" and args.dry_run:
+            runner.plan(args.to)
+        elif args.command == "up":
+            runner.up(args.to)
+        elif args.command == "baseline":
+            runner.baseline(args.version)
+        elif args.command == "backfill":
+            step = BACKFILLS[args.name](args.all)
+            if not step.applies():
+                print(f"[INFO] {step.description} is not used on {engine.dialect.name}")
+            elif args.dry_run:
+                print(f"  - {step.describe(args.after_id)}")
+            else:
+                runner.run_chunks(step, after_id=args.after_id)
+        elif args.command == "reset":
+            if not args.yes:
+                print("[ERROR] This drops every table; pass --yes to confirm")
+                sys.exit(1)
+            models.Base.metadata.drop_all(bind=engine)
+            print("[SUCCESS] Tables dropped")
+    except MigrationError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    finally:
+        lock_conn.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
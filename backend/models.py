@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, Boolean, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, func, Boolean, ForeignKey, UniqueConstraint, Index, JSON
 from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
 from database import Base
 
 class User(Base):
@@ -10,6 +11,10 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     is_2fa_enabled = Column(Boolean, default=False)
     otp_secret = Column(String(100), nullable=True)
+    # Maintained by crud on contact create/delete; repair_contact_counts.py recomputes it
+    contact_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped by every contact write; routes derive ETags from it
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     contacts = relationship("Contact", back_populates="owner")
@@ -23,14 +28,84 @@ class Contact(Base):
     phone = Column(String(20), nullable=False)
     email = Column(String(100), nullable=True)
     address = Column(String(255), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set client-side so writes can return the row without re-reading it
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+    # Search keys maintained by crud (search_index.normalized_fields); `migrate.py backfill search_keys` fills old rows
+    name_norm = Column(String(100), nullable=True)
+    phone_digits = Column(String(20), nullable=True)
+    email_norm = Column(String(100), nullable=True)
+    name_phonetic = Column(String(20), nullable=True)
 
     owner = relationship("User", back_populates="contacts")
 
     # Unique constraint: each user cannot have duplicate phone numbers
     __table_args__ = (
         UniqueConstraint('user_id', 'phone', name='uq_user_phone'),
+        # Keyset pagination walks this index in (name, id) order
+        Index('ix_contacts_user_name_id', 'user_id', 'name', 'id'),
+        # Prefix and sounds-like lookups on the normalized keys are range scans on these
+        Index('ix_contacts_user_name_norm', 'user_id', 'name_norm'),
+        Index('ix_contacts_user_phone_digits', 'user_id', 'phone_digits'),
+        Index('ix_contacts_user_email_norm', 'user_id', 'email_norm'),
+        Index('ix_contacts_user_name_phonetic', 'user_id', 'name_phonetic'),
+        # Candidate prefilter for fuzzy search on MySQL; other backends use contact_ngrams
+        Index(
+            'ft_contacts_search', 'name', 'phone', 'email',
+            mysql_prefix='FULLTEXT', mysql_with_parser='ngram',
+        ).ddl_if(dialect='mysql'),
     )
 
     def __repr__(self):
         return f"<Contact(id={self.id}, name='{self.name}', phone='{self.phone}', created_at='{self.created_at}')>"
+
+class ContactNgram(Base):
+    """Trigram side table used to prefilter search candidates on non-MySQL backends"""
+    __tablename__ = "contact_ngrams"
+
+    contact_id = Column(Integer, ForeignKey("contacts.id", ondelete="CASCADE"), primary_key=True)
+    gram = Column(String(3), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('ix_contact_ngrams_user_gram', 'user_id', 'gram'),
+    )
+
+class Job(Base):
+    """Background operation run by jobs.py; the row outlives the worker that ran it"""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(50), nullable=False)
+    # queued -> running -> succeeded | failed | cancelled
+    status = Column(String(20), nullable=False, default="queued")
+    processed = Column(Integer, nullable=False, default=0, server_default="0")
+    # Unknown until the job has sized its input
+    total = Column(Integer, nullable=True)
+    # Checked by the worker between steps, so any process can cancel a job
+    cancel_requested = Column(Boolean, nullable=False, default=False, server_default="0")
+    result = Column(JSON, nullable=True)
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Heartbeat written with progress; a queued or running job that stops beating was orphaned by a restart
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_jobs_user_created', 'user_id', 'created_at'),
+    )
+
+class SchemaMigration(Base):
+    """Versions applied by migrate.py, with the resume point of one still running"""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String(100), nullable=False)
+    # running -> applied
+    status = Column(String(20), nullable=False, default="running")
+    # Next step to run and, within a chunked step, the primary key it resumes after
+    step = Column(Integer, nullable=False, default=0, server_default="0")
+    last_id = Column(Integer, nullable=False, default=0, server_default="0")
+    started_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+    applied_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,132 @@
+"""Worker cold-start profile.
+
+Starts fresh interpreters that import the app the way a server worker does,
+run its startup handlers and serve one request, and reports where the time
+goes:
+
+    python profile_startup.py --runs 5
+
+Import time is broken down with `python -X importtime` into the application's
+own modules and the third-party packages they pull in. The report also checks
+that packages only some endpoints need are not loaded at startup.
+
+DATABASE_URL selects the database; without it a SQLite file in the system temp
+directory is used.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Only needed by particular endpoints, so a worker should start without them
+DEFERRED_MODULES = ("numpy", "rapidfuzz", "jose", "pyotp")
+
+# Runs in the child interpreter
+CHILD = """
+import asyncio, json, sys, time
+import httpx
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def boot():
+    # The same startup handlers a server runs before accepting connections
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://profile") as client:
+            status = (await client.get("/health")).status_code
+        return ready, status
+
+ready, status = asyncio.run(boot())
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (served - ready) * 1000,
+    "status": status,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def parse_importtime(stderr):
+    """Cumulative microseconds of each package or module imported by `main`"""
+    cumulative = {}
+    pending = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative_us, name = line.split("|")
+        if not cumulative_us.strip().isdigit():
+            continue
+        # Children are printed before their parent, indented two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth > 0:
+            if "." not in name:
+                pending[name] = pending.get(name, 0) + int(cumulative_us)
+            continue
+        if name == "main":
+            cumulative = pending
+        pending = {}
+    return cumulative
+
+
+def run_once(env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["modules"] = parse_importtime(result.stderr)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--top", type=int, default=15, help="modules to list in the import breakdown")
+    parser.add_argument("--output", help="also write the medians as JSON to this path")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "phonebook_profile.db"))
+    runs = [run_once(env) for _ in range(args.runs)]
+
+    phases = ("import_ms", "startup_ms", "first_request_ms")
+    medians = {phase: statistics.median(run[phase] for run in runs) for phase in phases}
+    medians["total_ms"] = sum(medians[phase] for phase in phases)
+    modules = {}
+    for run in runs:
+        for name, us in run["modules"].items():
+            modules.setdefault(name, []).append(us)
+    module_ms = {name: statistics.median(values) / 1000 for name, values in modules.items()}
+
+    print(f"[INFO] Median of {args.runs} cold starts")
+    for phase in phases + ("total_ms",):
+        print(f"  {phase:<18} {medians[phase]:>8.1f} ms")
+    print(f"[INFO] Slowest imports (cumulative, includes their dependencies)")
+    for name, ms in sorted(module_ms.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<30} {ms:>8.1f} ms")
+    loaded = sorted(set().union(*(run["loaded"] for run in runs)))
+    if loaded:
+        print(f"[ERROR] Loaded during startup although only used on demand: {', '.join(loaded)}")
+    else:
+        print(f"[SUCCESS] Deferred until first use: {', '.join(DEFERRED_MODULES)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"medians": medians, "modules_ms": module_ms, "loaded": loaded}, f, indent=2)
+        print(f"[SUCCESS] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
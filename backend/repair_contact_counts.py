@@ -0,0 +1,25 @@
+# Recompute users.contact_count from the contacts table
+# Usage: python repair_contact_counts.py [user_id ...]
+import sys
+
+from database import SessionLocal
+import models
+import crud
+
+BATCH_SIZE = 1000
+
+db = SessionLocal()
+try:
+    if len(sys.argv) > 1:
+        user_ids = [int(arg) for arg in sys.argv[1:]]
+    else:
+        user_ids = [row.id for row in db.query(models.User.id).order_by(models.User.id)]
+    
+    # One short transaction per batch keeps the users table available
+    repaired = 0
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        repaired += crud.reconcile_contact_counts(db, user_ids[start:start + BATCH_SIZE])
+    
+    print(f"[SUCCESS] Checked {len(user_ids)} user(s), repaired {repaired} contact count(s)")
+finally:
+    db.close()
@@ -1,31 +0,0 @@
-import mysql.connector
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = os.getenv("DB_NAME")
-
-try:
-    connection = mysql.connector.connect(
-        host=DB_HOST,
-        port=int(DB_PORT),
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME
-    )
-    
-    cursor = connection.cursor()
-    cursor.execute("DROP TABLE IF EXISTS contacts")
-    cursor.execute("DROP TABLE IF EXISTS users")
-    print("[SUCCESS] Tables dropped successfully.")
-    
-    cursor.close()
-    connection.close()
-    
-except mysql.connector.Error as err:
-    print(f"[ERROR] {err}")
@@ -1,44 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple, Union
 from datetime import timedelta
-from rapidfuzz import process, fuzz
+import hashlib
+from pydantic import ValidationError
 
 import crud
 import schemas
 import auth
 import models
-from database import get_db
+import search_index
+import contact_io
+import dedupe
+import jobs
+import fast_json
+import metrics
+from database import get_db, get_async_db, read_session, async_read_session
+
+IMPORT_BATCH_SIZE = 1000
+# Largest page GET /contacts/ returns
+CONTACTS_MAX_PAGE_SIZE = 1000
 
 router = APIRouter()
 
+# Read-only routes use these: a replica when one is healthy, the primary for a
+# user who has just written
+def get_read_db(user_id: int = Depends(auth.get_current_user_id)):
+    db = read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(user_id: int = Depends(auth.get_current_user_id)):
+    async with async_read_session(user_id) as db:
+        yield db
+
+def _contacts_etag(request: Request, user_id: int, data_version: int) -> str:
+    """Strong ETag for a contacts response: the user's data version plus the exact URL queried"""
+    variant = hashlib.sha256(
+        f"{request.url.path}?{sorted(request.query_params.multi_items())}".encode()
+    ).hexdigest()[:16]
+    return f'"{user_id}-{data_version}-{variant}"'
+
+def _check_etag(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Set the validator headers, returning a 304 response if the client's copy is current"""
+    headers = {
+        "ETag": etag,
+        # Browsers revalidate on every use, so stale pages are never shown
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
 # Authentication Endpoints
 
 @router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED, tags=["auth"])
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud.get_user_by_email_async(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    hashed_password = await auth.get_password_hash_async(user.password)
+    return await crud.create_user_async(db=db, user=user, hashed_password=hashed_password)
 
 @router.post("/login", response_model=schemas.Token, tags=["auth"])
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await crud.get_user_by_email_async(db, email=form_data.username)
+    if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Upgrade hashes made with an old work factor while we have the plain password
+    if auth.needs_rehash(user.hashed_password):
+        try:
+            hashed_password = await auth.get_password_hash_async(form_data.password)
+        except HTTPException:
+            pass  # Hashing pool saturated; upgrade on a later login
+        else:
+            await crud.update_password_hash_async(db, user.id, hashed_password)
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/users/me", response_model=schemas.User, tags=["auth"])
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
 
 @router.post("/2fa/setup", tags=["auth"])
@@ -46,16 +105,19 @@ def setup_2fa(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    if current_user.is_2fa_enabled:
+    # current_user may be a cached snapshot, so modify a freshly loaded row
+    user = crud.get_user(db, current_user.id)
+    if user.is_2fa_enabled:
         return {"message": "2FA already enabled"}
     
     secret = auth.generate_totp_secret()
     # Temporarily store secret or just return it for verification
     # For simplicity, we update the user but don't set is_2fa_enabled until verified
-    current_user.otp_secret = secret
+    user.otp_secret = secret
     db.commit()
+    auth.invalidate_user(user.id)
     
-    uri = auth.get_totp_uri(secret, current_user.email)
+    uri = auth.get_totp_uri(secret, user.email)
     return {"secret": secret, "uri": uri}
 
 @router.post("/2fa/verify-setup", tags=["auth"])
@@ -66,9 +128,11 @@ def verify_setup_2fa(
     current_user: models.User = Depends(auth.get_current_user)
 ):
     if auth.verify_totp(secret, code):
-        current_user.is_2fa_enabled = True
-        current_user.otp_secret = secret # Ensure it's saved
+        user = crud.get_user(db, current_user.id)
+        user.is_2fa_enabled = True
+        user.otp_secret = secret # Ensure it's saved
         db.commit()
+        auth.invalidate_user(user.id)
         return {"message": "2FA enabled successfully"}
     raise HTTPException(status_code=400, detail="Invalid code")
 
@@ -92,43 +156,242 @@ def verify_login_2fa(
 def create_contact(
     contact: schemas.ContactCreate, 
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    user_id: int = Depends(auth.get_current_user_id)
 ):
     """Create a new contact"""
-    return crud.create_contact(db=db, contact=contact, user_id=current_user.id)
+    return crud.create_contact(db=db, contact=contact, user_id=user_id)
 
-@router.get("/contacts/", response_model=schemas.ContactPaginatedResponse, tags=["contacts"])
-def read_contacts(
-    page: int = 1, 
-    page_size: int = 20, 
+@router.post("/contacts/import", response_model=schemas.ContactImportResult, tags=["contacts"])
+async def import_contacts(
+    request: Request,
+    format: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Bulk import contacts from a streamed CSV, JSONL or vCard body
+    
+    The format comes from `format` or the Content-Type header. Rows are validated
+    with the ContactCreate rules and written in batches; failures are reported per row.
+    """
+    fmt = contact_io.detect_format(format, request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Unsupported import format, use csv, jsonl or vcard"
+        )
+    
+    imported = 0
+    errors = []
+    batch = []
+    
+    async def flush():
+        nonlocal imported
+        count, batch_errors = await run_in_threadpool(
+            crud.import_contacts, db, user_id, batch
+        )
+        imported += count
+        errors.extend(batch_errors)
+        batch.clear()
+    
+    async for row_number, fields, error in contact_io.parse(fmt, request.stream()):
+        if error is None:
+            try:
+                batch.append((row_number, schemas.ContactCreate.model_validate(fields)))
+            except ValidationError as e:
+                error = "; ".join(err["msg"] for err in e.errors())
+        if error is not None:
+            phone = (fields or {}).get("phone")
+            # Reported as text whatever type the upload used
+            errors.append({"row": row_number, "phone": None if phone is None else str(phone), "detail": error})
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    
+    errors.sort(key=lambda e: e["row"])
+    return {"imported": imported, "failed": len(errors), "errors": errors}
+
+@router.get("/contacts/export", tags=["contacts"])
+def export_contacts(
+    format: str = "ndjson",
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Stream all contacts as NDJSON, CSV or vCard"""
+    fmt = contact_io.detect_format(format, None)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Unsupported export format, use ndjson, csv or vcard")
+    
+    def generate():
+        # The session must outlive this handler, so the stream owns it
+        db = read_session(user_id)
+        try:
+            yield from contact_io.export(fmt, crud.stream_contacts(db, user_id))
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        generate(),
+        media_type=contact_io.EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{contact_io.EXPORT_EXTENSIONS[fmt]}"'}
+    )
+
+@router.post("/contacts/batch-delete", response_model=schemas.ContactBatchResult, tags=["contacts"])
+def batch_delete_contacts(
+    selection: schemas.ContactBatchDelete,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Delete contacts by `ids` or by `filter`, reporting the outcome for each id"""
+    return _batch_result(crud.delete_contacts(db=db, user_id=user_id, selection=selection))
+
+@router.patch("/contacts/batch", response_model=schemas.ContactBatchResult, tags=["contacts"])
+def batch_update_contacts(
+    batch: schemas.ContactBatchUpdate,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Apply `changes` (name, email and/or address) to contacts selected by `ids` or `filter`"""
+    return _batch_result(crud.update_contacts(db=db, user_id=user_id, selection=batch, changes=batch.changes))
+
+def _batch_result(outcomes: List[dict]) -> dict:
+    failed = sum(1 for outcome in outcomes if outcome["status"] == "not_found")
+    return {"succeeded": len(outcomes) - failed, "failed": failed, "results": outcomes}
+
+# Registered before /contacts/{contact_id} so "duplicates" is not taken for an id
+@router.get("/contacts/duplicates", response_model=schemas.DuplicateReport, tags=["contacts"])
+def find_duplicate_contacts(
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Propose clusters of likely duplicate contacts, most certain first"""
+    clusters = dedupe.find_clusters(crud.get_dedupe_contacts(db=db, user_id=user_id))
+    return {"clusters": clusters[:limit], "total": len(clusters)}
+
+@router.post("/contacts/merge", response_model=schemas.ContactMergeResult, tags=["contacts"])
+def merge_contacts(
+    merge: schemas.ContactMergeRequest,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Apply accepted duplicate clusters: each primary absorbs and replaces its duplicates"""
+    outcomes = crud.merge_contacts(db=db, user_id=user_id, clusters=merge.clusters)
+    return {"merged": sum(1 for outcome in outcomes if outcome["status"] == "merged"), "results": outcomes}
+
+# Registered before /contacts/{contact_id} so "suggest" is not taken for an id
+@router.get("/contacts/suggest", response_model=List[schemas.ContactSuggestion], tags=["contacts"])
+async def suggest_contacts(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(search_index.SUGGEST_DEFAULT_LIMIT, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_read_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Typeahead completions for `prefix` over names, name tokens, phone digits and emails
+    
+    Served from the worker's in-memory index, which crud keeps current on every write
+    and which is reloaded when another worker has written since it was built.
+    """
+    user_index = search_index.index.get(user_id, await crud.get_data_version_async(db, user_id))
+    if user_index is None:
+        user_index = await run_in_threadpool(_load_suggest_index, user_id)
+    if user_index is None:
+        # Too large to hold in memory: prefix range scans on the normalized key indexes
+        suggestions = await run_in_threadpool(_suggest_from_db, user_id, prefix, limit)
+    else:
+        suggestions = user_index.suggest(prefix, limit)
+    return fast_json.FastJSONResponse([
+        {"id": c.id, "name": c.name, "phone": c.phone, "email": c.email, "match": match}
+        for c, match in suggestions
+    ])
+
+def _load_suggest_index(user_id: int) -> Optional[search_index.UserIndex]:
+    db = read_session(user_id)
+    try:
+        contact_count, data_version = crud.get_index_state(db, user_id)
+        if contact_count > search_index.SUGGEST_MAX_CONTACTS:
+            return None
+        return search_index.index.get_or_load(
+            user_id, lambda: crud.get_all_contacts(db=db, user_id=user_id), data_version
+        )
+    finally:
+        db.close()
+
+def _suggest_from_db(user_id: int, prefix: str, limit: int):
+    db = read_session(user_id)
+    try:
+        return crud.suggest_contacts(db, user_id, prefix, limit)
+    finally:
+        db.close()
+
+@router.get("/contacts/", response_model=Union[schemas.ContactPaginatedResponse, schemas.ContactCursorPage], tags=["contacts"])
+async def read_contacts(
+    request: Request,
+    response: Response,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=CONTACTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    user_id: int = Depends(auth.get_current_user_id)
 ):
-    """Get all contacts with pagination"""
+    """Get all contacts with pagination
+    
+    Pass `cursor` (empty for the first page, then the returned `next_cursor`)
+    for keyset pagination, which costs the same at any depth.
+    `fields` (e.g. `id,name,phone`) limits the columns returned per contact.
+    Responses carry an ETag; a matching If-None-Match gets a 304.
+    """
+    columns = fast_json.parse_fields(fields)
+    
+    # Read the version before the data so a concurrent write can only make the ETag older
+    data_version = await crud.get_data_version_async(db, user_id)
+    if data_version is not None:
+        not_modified = _check_etag(request, response, _contacts_etag(request, user_id, data_version))
+        if not_modified is not None:
+            return not_modified
+    
+    # Rows are plain column tuples encoded directly, without per-row model validation
+    if cursor is not None:
+        rows, next_cursor = await crud.get_contact_rows_after_async(
+            db=db, user_id=user_id, fields=columns, cursor=cursor, limit=page_size
+        )
+        return fast_json.FastJSONResponse({
+            "data": [dict(zip(columns, row)) for row in rows],
+            "page_size": page_size,
+            "next_cursor": next_cursor
+        }, headers=response.headers)
+    
     # Calculate skip/limit
     skip = (page - 1) * page_size
     limit = page_size
     
-    contacts, total = crud.get_contacts(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    rows, total = await crud.get_contact_rows_async(db=db, user_id=user_id, fields=columns, skip=skip, limit=limit)
     
     total_pages = (total + page_size - 1) // page_size if total > 0 else 0
     
-    return {
-        "data": contacts,
+    return fast_json.FastJSONResponse({
+        "data": [dict(zip(columns, row)) for row in rows],
         "page": page,
         "page_size": page_size,
         "total": total,
         "total_pages": total_pages
-    }
+    }, headers=response.headers)
 
 @router.get("/contacts/{contact_id}", response_model=schemas.Contact, tags=["contacts"])
-def read_contact(
+async def read_contact(
     contact_id: int, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    user_id: int = Depends(auth.get_current_user_id)
 ):
     """Get a single contact by ID"""
-    db_contact = crud.get_contact(db=db, contact_id=contact_id, user_id=current_user.id)
+    data_version = await crud.get_data_version_async(db, user_id)
+    if data_version is not None:
+        not_modified = _check_etag(request, response, _contacts_etag(request, user_id, data_version))
+        if not_modified is not None:
+            return not_modified
+    db_contact = await crud.get_contact_async(db=db, contact_id=contact_id, user_id=user_id)
     if db_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
     return db_contact
@@ -138,10 +401,10 @@ def update_contact(
     contact_id: int, 
     contact: schemas.ContactUpdate, 
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    user_id: int = Depends(auth.get_current_user_id)
 ):
     """Update a contact"""
-    db_contact = crud.update_contact(db=db, contact_id=contact_id, contact=contact, user_id=current_user.id)
+    db_contact = crud.update_contact(db=db, contact_id=contact_id, contact=contact, user_id=user_id)
     if db_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
     return db_contact
@@ -150,10 +413,10 @@ def update_contact(
 def delete_contact(
     contact_id: int, 
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    user_id: int = Depends(auth.get_current_user_id)
 ):
     """Delete a contact"""
-    success = crud.delete_contact(db=db, contact_id=contact_id, user_id=current_user.id)
+    success = crud.delete_contact(db=db, contact_id=contact_id, user_id=user_id)
     if not success:
         raise HTTPException(status_code=404, detail="Contact not found")
     return None
@@ -163,40 +426,145 @@ def delete_contact(
 @router.get("/search", response_model=schemas.ContactSearch, tags=["search"])
 def search_contacts(
     q: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    fields: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=search_index.SEARCH_MAX_LIMIT),
+    db: Session = Depends(get_read_db),
+    user_id: int = Depends(auth.get_current_user_id)
 ):
-    """Search contacts using fuzzy matching"""
-    # Fetch all contacts for the user
-    # Note: search might need optimization later, currently fetches all
-    all_contacts, _ = crud.get_contacts(db=db, user_id=current_user.id, limit=1000)
+    """Search contacts using fuzzy matching
+    
+    Queries longer than two characters are ranked by weighted name, phone and
+    email similarity, best first, with each result's `score`; `limit` defaults
+    to 10 for them. Shorter queries return substring matches in name order.
+    `offset`/`limit` page through either kind of result.
+    `fields` limits the attributes returned per contact, as in GET /contacts/.
+    """
+    columns = fast_json.parse_fields(fields)
+    
+    # Small address books are served from the worker's per-user index, kept current by crud;
+    # the data version catches writes made through other workers
+    contact_count, data_version = crud.get_index_state(db, user_id)
+    user_index = search_index.index.get(user_id, data_version)
+    if user_index is None and contact_count <= search_index.SEARCH_PREFILTER_MIN_CONTACTS:
+        user_index = search_index.index.get_or_load(
+            user_id, lambda: crud.get_all_contacts(db=db, user_id=user_id), data_version
+        )
+    if user_index is None and (not q.strip() or len(q) <= 2):
+        # Large address books: substring matches are counted and paged by the database
+        contacts, total = crud.search_contacts_substring(db, user_id, q, offset, limit)
+        return _search_response([(c, None) for c in contacts], q, columns, total, offset, limit)
+    if user_index is None:
+        # Large address books: the database narrows the candidates, RapidFuzz re-ranks them
+        user_index = search_index.UserIndex(crud.search_contact_candidates(
+            db=db, user_id=user_id, q=q or "",
+            limit=max(search_index.SEARCH_CANDIDATE_LIMIT, offset + (limit or search_index.SEARCH_DEFAULT_LIMIT))
+        ))
+    all_contacts = user_index.ordered()
     
     if not q or not q.strip():
-        return {
-            "results": all_contacts,
-            "query": q,
-            "total": len(all_contacts)
-        }
-    
-    # For short queries (1-2 characters), use simple case-insensitive contains matching
-    if len(q) <= 2:
-        q_lower = q.lower()
+        matched_contacts = all_contacts
+    elif len(q) <= 2:
+        # For short queries (1-2 characters), use simple case-insensitive contains matching
+        # Keys were normalized when the contact was written
+        q_norm = search_index.normalize_text(q)
+        q_digits = search_index.phone_query_digits(q)
         matched_contacts = [
             c for c in all_contacts 
-            if q_lower in c.name.lower() 
-            or q_lower in c.phone 
-            or (c.email and q_lower in c.email.lower())
+            if q_norm in c.name_norm 
+            or (q_digits and q_digits in c.phone_digits) 
+            or q_norm in c.email_norm
         ]
     else:
-        # For longer queries, use fuzzy matching
-        choices = {c.id: f"{c.name} {c.phone} {c.email or ''}" for c in all_contacts}
-        results = process.extract(q, choices, limit=10, scorer=fuzz.token_set_ratio)
-        # Lower threshold for better matching
-        matched_ids = [res[2] for res in results if res[1] > 30]
-        matched_contacts = [c for c in all_contacts if c.id in matched_ids]
-    
-    return {
-        "results": matched_contacts,
+        # For longer queries, rank by fuzzy score and keep only the requested page
+        limit = limit or search_index.SEARCH_DEFAULT_LIMIT
+        with metrics.SEARCH_SCORING_SECONDS.time():
+            hits, total = search_index.rank(user_index, q, offset + limit)
+        return _search_response(hits[offset:], q, columns, total, offset, limit)
+    
+    page = matched_contacts[offset:offset + limit] if limit else matched_contacts[offset:]
+    return _search_response([(c, None) for c in page], q, columns, len(matched_contacts), offset, limit)
+
+def _search_response(hits: List[Tuple[search_index.IndexedContact, Optional[float]]], q: str, columns,
+                     total: int, offset: int, limit: Optional[int]) -> Response:
+    """Encode index entries directly, bypassing response_model; the body follows schemas.ContactSearch"""
+    return fast_json.FastJSONResponse({
+        "results": [{**{field: getattr(c, field) for field in columns}, "score": score} for c, score in hits],
         "query": q,
-        "total": len(matched_contacts)
-    }
+        "total": total,
+        "offset": offset,
+        "limit": limit
+    })
+
+# Background jobs: long operations run on the jobs.py worker pool and are polled at /api/jobs/{id}
+def _job_accepted(response: Response, job: models.Job) -> models.Job:
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return job
+
+@router.post("/jobs/duplicates", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED, tags=["jobs"])
+def start_duplicate_scan(
+    response: Response,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Scan the whole address book for duplicates; the result lists clusters of contact ids"""
+    return _job_accepted(response, jobs.submit(db, user_id, "find_duplicates", jobs.find_duplicates_job))
+
+@router.post("/jobs/merge", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED, tags=["jobs"])
+def start_merge(
+    merge: schemas.ContactMergeRequest,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Run POST /api/contacts/merge in the background"""
+    return _job_accepted(response, jobs.submit(db, user_id, "merge_contacts", jobs.merge_contacts_job, merge.clusters))
+
+@router.post("/jobs/batch-delete", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED, tags=["jobs"])
+def start_batch_delete(
+    selection: schemas.ContactBatchDelete,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Run POST /api/contacts/batch-delete in the background"""
+    return _job_accepted(response, jobs.submit(db, user_id, "delete_contacts", jobs.delete_contacts_job, selection))
+
+@router.post("/jobs/batch-update", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED, tags=["jobs"])
+def start_batch_update(
+    batch: schemas.ContactBatchUpdate,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Run PATCH /api/contacts/batch in the background"""
+    return _job_accepted(
+        response, jobs.submit(db, user_id, "update_contacts", jobs.update_contacts_job, batch, batch.changes)
+    )
+
+@router.get("/jobs", response_model=List[schemas.Job], tags=["jobs"])
+def list_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """The user's most recent jobs, newest first"""
+    return jobs.list_jobs(db, user_id, limit)
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job, tags=["jobs"])
+def read_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Status, progress and, once finished, the result of a job"""
+    return jobs.get_job(db, user_id, job_id)
+
+@router.post("/jobs/{job_id}/cancel", response_model=schemas.Job, tags=["jobs"])
+def cancel_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(auth.get_current_user_id)
+):
+    """Ask a job to stop; work it already committed is kept"""
+    return jobs.cancel(db, user_id, job_id)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import List, Optional, Union
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+from typing import Any, List, Optional, Union
 from datetime import datetime
 import re
 
@@ -89,14 +89,175 @@ class Contact(ContactBase):
     class Config:
         from_attributes = True
 
+class ContactFields(BaseModel):
+    """A contact in list and search responses: every field is present unless `fields=` leaves it out"""
+    id: Optional[int] = None
+    name: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    address: Optional[str] = None
+    user_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+class ContactSearchHit(ContactFields):
+    # Weighted best-field fuzzy score (0-100); None for short substring matches
+    score: Optional[float] = None
+
+class ContactSuggestion(BaseModel):
+    id: int
+    name: str
+    phone: str
+    email: Optional[str] = None
+    # The key the prefix completed: a name, name token, phone digits or email
+    match: str
+
 class ContactSearch(BaseModel):
-    results: List[Contact]
+    results: List[ContactSearchHit]
     query: str
     total: int
+    offset: int = 0
+    limit: Optional[int] = None
 
 class ContactPaginatedResponse(BaseModel):
-    data: List[Contact]
+    data: List[ContactFields]
     page: int
     page_size: int
     total: int
     total_pages: int
+
+class ContactCursorPage(BaseModel):
+    data: List[ContactFields]
+    page_size: int
+    next_cursor: Optional[str] = None
+
+
+class ContactImportError(BaseModel):
+    row: int
+    phone: Optional[str] = None
+    detail: str
+
+class ContactImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ContactImportError]
+
+# Batch operations
+BATCH_MAX_IDS = 10000
+
+class ContactFilter(BaseModel):
+    """Selects contacts for a batch operation; every given criterion must match"""
+    name_prefix: Optional[str] = Field(None, min_length=1, max_length=100, description="Case-insensitive name prefix")
+    phone_prefix: Optional[str] = Field(None, min_length=1, max_length=20, description="Leading phone digits")
+    has_email: Optional[bool] = None
+    created_before: Optional[datetime] = None
+    created_after: Optional[datetime] = None
+
+    @model_validator(mode='after')
+    def require_criterion(self):
+        # An explicit null is no criterion; otherwise {"has_email": null} would select every contact
+        if all(getattr(self, field) is None for field in self.model_fields_set):
+            raise ValueError('filter needs at least one criterion')
+        return self
+
+class ContactBatchSelection(BaseModel):
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=BATCH_MAX_IDS)
+    filter: Optional[ContactFilter] = None
+
+    @model_validator(mode='after')
+    def require_one_selector(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError('give either ids or filter')
+        return self
+
+class ContactBatchDelete(ContactBatchSelection):
+    pass
+
+class ContactBatchChanges(BaseModel):
+    # Phone is left out: it is unique per user, so one value cannot be set on many contacts
+    name: Optional[str] = Field(None, min_length=1, max_length=100, description="Contact name")
+    email: Optional[str] = Field(None, description="Contact email address")
+    address: Optional[str] = Field(None, max_length=255, description="Contact address")
+
+    class Config:
+        extra = "forbid"
+
+    @field_validator('email')
+    @classmethod
+    def validate_email(cls, v: Optional[str]) -> Optional[str]:
+        if v and not re.match(r'^[\w\.-]+@[\w\.-]+\.\w+$', v):
+            raise ValueError('email should be in valid format')
+        return v
+
+    @field_validator('name')
+    @classmethod
+    def reject_null_name(cls, v: Optional[str]) -> str:
+        if v is None:
+            raise ValueError('name cannot be null')
+        return v
+
+    @model_validator(mode='after')
+    def require_change(self):
+        # A null email or address clears it, but only alongside a real change
+        if all(getattr(self, field) is None for field in self.model_fields_set):
+            raise ValueError('changes needs at least one field')
+        return self
+
+class ContactBatchUpdate(ContactBatchSelection):
+    changes: ContactBatchChanges
+
+class ContactBatchOutcome(BaseModel):
+    id: int
+    # "deleted", "updated" or "not_found"
+    status: str
+
+class ContactBatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[ContactBatchOutcome]
+
+# Duplicate detection and merge
+class DuplicateCluster(BaseModel):
+    primary_id: int
+    # Weakest pair score (0-100) that joined the cluster
+    score: float
+    contacts: List[Contact]
+
+class DuplicateReport(BaseModel):
+    clusters: List[DuplicateCluster]
+    total: int
+
+class MergeCluster(BaseModel):
+    primary_id: int
+    duplicate_ids: List[int] = Field(..., min_length=1, max_length=100)
+
+class ContactMergeRequest(BaseModel):
+    clusters: List[MergeCluster] = Field(..., min_length=1, max_length=1000)
+
+class ContactMergeOutcome(BaseModel):
+    primary_id: int
+    # "merged", "not_found" (primary or a duplicate is gone) or "conflict" (id used twice)
+    status: str
+    merged_ids: List[int] = []
+
+class ContactMergeResult(BaseModel):
+    merged: int
+    results: List[ContactMergeOutcome]
+
+# Background jobs
+class Job(BaseModel):
+    id: int
+    kind: str
+    # queued, running, succeeded, failed or cancelled
+    status: str
+    processed: int
+    total: Optional[int] = None
+    cancel_requested: bool
+    # Set once the job has succeeded; its shape depends on the kind
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
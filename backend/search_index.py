@@ -0,0 +1,497 @@
+import bisect
+import os
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Index limits (per worker process)
+SEARCH_INDEX_MAX_USERS = int(os.getenv("SEARCH_INDEX_MAX_USERS", "256"))
+SEARCH_INDEX_MAX_BYTES = int(os.getenv("SEARCH_INDEX_MAX_BYTES", str(128 * 1024 * 1024)))
+# Writes made by other workers become visible once a cached index expires
+SEARCH_INDEX_TTL_SECONDS = float(os.getenv("SEARCH_INDEX_TTL_SECONDS", "300"))
+# Address books larger than this are searched through the database prefilter
+SEARCH_PREFILTER_MIN_CONTACTS = int(os.getenv("SEARCH_PREFILTER_MIN_CONTACTS", "5000"))
+# Maximum number of candidate rows handed to RapidFuzz for re-ranking
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "300"))
+
+# Ranked search: each field's 0-100 score is scaled by its weight and the best one counts
+SEARCH_FIELD_WEIGHTS = {
+    "name": float(os.getenv("SEARCH_WEIGHT_NAME", "1.0")),
+    "phone": float(os.getenv("SEARCH_WEIGHT_PHONE", "0.9")),
+    "email": float(os.getenv("SEARCH_WEIGHT_EMAIL", "0.8")),
+}
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "30"))
+SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", "10"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+# Typeahead: completions returned by default and the largest book held in memory for it
+SUGGEST_DEFAULT_LIMIT = int(os.getenv("SUGGEST_DEFAULT_LIMIT", "8"))
+SUGGEST_MAX_CONTACTS = int(os.getenv("SUGGEST_MAX_CONTACTS", "100000"))
+# Scoring spreads across all cores from this many contacts; below it threads cost more than they save
+SEARCH_PARALLEL_MIN_CONTACTS = int(os.getenv("SEARCH_PARALLEL_MIN_CONTACTS", "20000"))
+
+NGRAM_SIZE = 3
+
+
+def search_text(name: str, phone: str, email: Optional[str]) -> str:
+    """The string fuzzy search scores a contact against"""
+    return f"{name} {phone} {email or ''}"
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Casefolded form stored in name_norm / email_norm"""
+    return value.casefold() if value else ""
+
+
+# Width of name_norm and email_norm; casefolding can lengthen text ("ß" -> "ss")
+NORMALIZED_KEY_LENGTH = 100
+
+
+def normalized_key(value: Optional[str]) -> str:
+    """normalize_text cut to fit its column, for values written to name_norm / email_norm"""
+    return normalize_text(value)[:NORMALIZED_KEY_LENGTH]
+
+
+def phone_digits(phone: Optional[str]) -> str:
+    """Digits of a phone number, ignoring spacing, punctuation and a leading +"""
+    return "".join(ch for ch in phone or "" if ch.isdigit())
+
+
+# Characters people type between phone digits
+PHONE_PUNCTUATION = frozenset(" +-().")
+
+
+def phone_query_digits(q: str) -> str:
+    """Digits of a query typed as a phone number; empty when it has anything else, such as letters
+
+    Substring search compares these with phone_digits, so "a1" does not match
+    every phone containing a 1.
+    """
+    if all(ch.isdigit() or ch in PHONE_PUNCTUATION for ch in q):
+        return phone_digits(q)
+    return ""
+
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+# Tokens kept in name_phonetic (4 codes of 4 chars plus separators fit its column)
+PHONETIC_MAX_TOKENS = 4
+
+
+def soundex(word: str) -> str:
+    """American Soundex code of a word, or "" if it has no ASCII letters"""
+    # Decompose accented letters so "Ż" codes like "Z"
+    letters = [ch for ch in unicodedata.normalize("NFKD", word.casefold()) if "a" <= ch <= "z"]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for ch in letters[1:]:
+        digit = _SOUNDEX_CODES.get(ch, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate letters with the same code; vowels do
+        if ch not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def phonetic_key(name: Optional[str]) -> str:
+    """Space-separated Soundex codes of the first few name tokens"""
+    codes = [soundex(token) for token in normalize_text(name).split()]
+    return " ".join([code for code in codes if code][:PHONETIC_MAX_TOKENS])
+
+
+def normalized_fields(name: str, phone: str, email: Optional[str]) -> Dict[str, Optional[str]]:
+    """Values of the normalized search columns on models.Contact"""
+    return {
+        "name_norm": normalized_key(name),
+        "phone_digits": phone_digits(phone),
+        "email_norm": normalized_key(email) or None,
+        "name_phonetic": phonetic_key(name),
+    }
+
+
+def ngrams(text: str) -> Set[str]:
+    """Distinct lowercase trigrams of each whitespace-separated token"""
+    grams = set()
+    for token in text.lower().split():
+        for i in range(len(token) - NGRAM_SIZE + 1):
+            grams.add(token[i:i + NGRAM_SIZE])
+    return grams
+
+
+def prefix_keys(name_norm: str, phone_digits: str, email_norm: str) -> Set[str]:
+    """Strings a typeahead prefix is matched against: full name, later name tokens, phone digits, email"""
+    keys = {name_norm}
+    keys.update(name_norm.split()[1:])
+    keys.add(phone_digits)
+    keys.add(email_norm)
+    keys.discard("")
+    return keys
+
+
+def normalize_prefix(prefix: str) -> str:
+    """Typeahead input in key form; numbers typed with spaces or dashes become phone digits"""
+    prefix = normalize_text(prefix).strip()
+    if prefix and not any(ch.isalpha() for ch in prefix) and any(ch.isdigit() for ch in prefix):
+        return phone_digits(prefix)
+    return prefix
+
+
+class IndexedContact:
+    """Lightweight copy of a contact row with its precomputed search strings"""
+
+    __slots__ = (
+        "id", "user_id", "name", "phone", "email", "address", "created_at",
+        "name_norm", "phone_digits", "email_norm", "size",
+    )
+
+    def __init__(self, contact):
+        self.id = contact.id
+        self.user_id = contact.user_id
+        self.name = contact.name
+        self.phone = contact.phone
+        self.email = contact.email
+        self.address = contact.address
+        self.created_at = contact.created_at
+        # Stored keys are used as-is; rows not yet backfilled are normalized here
+        self.name_norm = getattr(contact, "name_norm", None) or normalize_text(contact.name)
+        self.phone_digits = getattr(contact, "phone_digits", None) or phone_digits(contact.phone)
+        self.email_norm = getattr(contact, "email_norm", None) or normalize_text(contact.email)
+        self.size = self._size()
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this entry"""
+        return self.size
+
+    def _size(self) -> int:
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.name) + sys.getsizeof(self.phone)
+            + sys.getsizeof(self.email) + sys.getsizeof(self.address)
+            + sys.getsizeof(self.name_norm) + sys.getsizeof(self.phone_digits)
+            + sys.getsizeof(self.email_norm)
+            # Typeahead entries: two list slots per key plus the name tokens
+            + sum(16 + (sys.getsizeof(key) if key not in (self.name_norm, self.phone_digits, self.email_norm) else 0)
+                  for key in self.prefix_keys())
+        )
+
+    def prefix_keys(self) -> Set[str]:
+        return prefix_keys(self.name_norm, self.phone_digits, self.email_norm)
+
+
+class UserIndex:
+    """All searchable contacts of a single user"""
+
+    def __init__(self, contacts: Iterable = (), data_version: Optional[int] = None):
+        self.contacts: Dict[int, IndexedContact] = {}
+        self.nbytes = 0
+        self.loaded_at = time.monotonic()
+        # users.data_version the contacts were read at; None when unknown
+        self.data_version = data_version
+        # (ordered contacts, aligned key columns), built together and replaced as one value
+        self._snapshot: Optional[Tuple[List[IndexedContact], Tuple[List[str], List[str], List[str]]]] = None
+        # Writes come from threadpool requests while searches read
+        self._lock = threading.Lock()
+        # Sorted typeahead keys with the contact id of each entry, in (key, id) order
+        self._keys: List[str] = []
+        self._key_ids: List[int] = []
+        self._loading = True
+        for contact in contacts:
+            self.upsert(contact)
+        self._loading = False
+        keys, key_ids = [], []
+        for contact_id in sorted(self.contacts):
+            for key in self.contacts[contact_id].prefix_keys():
+                keys.append(key)
+                key_ids.append(contact_id)
+        # A stable sort on the key alone keeps equal keys in id order
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys = [keys[i] for i in order]
+        self._key_ids = [key_ids[i] for i in order]
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def upsert(self, contact) -> int:
+        """Add or replace a contact, returning the change in size"""
+        entry = IndexedContact(contact)
+        with self._lock:
+            old = self.contacts.get(entry.id)
+            delta = entry.nbytes() - (old.nbytes() if old else 0)
+            self.contacts[entry.id] = entry
+            self.nbytes += delta
+            self._snapshot = None
+            if not self._loading:
+                # Kept current in place; a rebuild would cost a full sort per write
+                if old is not None:
+                    self._remove_keys(old)
+                self._insert_keys(entry)
+        return delta
+
+    def remove(self, contact_id: int) -> int:
+        """Drop a contact, returning the change in size"""
+        with self._lock:
+            old = self.contacts.pop(contact_id, None)
+            if old is None:
+                return 0
+            self.nbytes -= old.nbytes()
+            self._snapshot = None
+            self._remove_keys(old)
+        return -old.nbytes()
+
+    def _insert_keys(self, entry: IndexedContact) -> None:
+        for key in entry.prefix_keys():
+            i = bisect.bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key and self._key_ids[i] < entry.id:
+                i += 1
+            self._keys.insert(i, key)
+            self._key_ids.insert(i, entry.id)
+
+    def _remove_keys(self, entry: IndexedContact) -> None:
+        for key in entry.prefix_keys():
+            i = bisect.bisect_left(self._keys, key)
+            while i < len(self._keys) and self._keys[i] == key:
+                if self._key_ids[i] == entry.id:
+                    del self._keys[i]
+                    del self._key_ids[i]
+                    break
+                i += 1
+
+    def suggest(self, prefix: str, limit: int) -> List[Tuple[IndexedContact, str]]:
+        """Up to `limit` contacts with a key starting with `prefix`, with the key that matched
+
+        Completions come back in key order; only the matching run of the sorted
+        key array is read, so the cost does not depend on the book's size.
+        """
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        # Writes shift the key arrays in place; the run read here is short, so the lock is held briefly
+        with self._lock:
+            keys, key_ids = self._keys, self._key_ids
+            i = bisect.bisect_left(keys, prefix)
+            while i < len(keys) and len(results) < limit and keys[i].startswith(prefix):
+                contact_id = key_ids[i]
+                if contact_id not in seen:
+                    seen.add(contact_id)
+                    results.append((self.contacts[contact_id], keys[i]))
+                i += 1
+        return results
+
+    def snapshot(self) -> Tuple[List[IndexedContact], Tuple[List[str], List[str], List[str]]]:
+        """Contacts in name order with their normalized names, phone digits and emails aligned to them
+
+        Both come from the same state of the index, so scores computed over the
+        columns index into the contact list even while writes continue.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    ordered = sorted(self.contacts.values(), key=lambda c: (c.name, c.id))
+                    snapshot = (ordered, (
+                        [c.name_norm for c in ordered],
+                        [c.phone_digits for c in ordered],
+                        [c.email_norm for c in ordered],
+                    ))
+                    self._snapshot = snapshot
+        return snapshot
+
+    def ordered(self) -> List[IndexedContact]:
+        """Contacts sorted by name, matching the order of crud.get_contacts"""
+        return self.snapshot()[0]
+
+
+def rank(user_index: UserIndex, q: str, k: int) -> Tuple[List[Tuple[IndexedContact, float]], int]:
+    """Best `k` contacts for `q` with their scores, plus how many score above SEARCH_MIN_SCORE
+
+    Every field is scored in one batched cdist call. Ties rank in name order, so
+    consecutive offset/limit pages do not overlap.
+    """
+    # Imported on first search; workers that never rank skip their import cost
+    import numpy as np
+    from rapidfuzz import fuzz, process
+
+    ordered, (names, phones, emails) = user_index.snapshot()
+    if not ordered or k <= 0:
+        return [], 0
+    workers = -1 if len(ordered) >= SEARCH_PARALLEL_MIN_CONTACTS else 1
+
+    def field_scores(query: str, choices: List[str], scorer, weight: float) -> np.ndarray:
+        scores = process.cdist([query], choices, scorer=scorer, dtype=np.float32, workers=workers)[0]
+        return scores * weight
+
+    q_norm = normalize_text(q)
+    scores = field_scores(q_norm, names, fuzz.token_set_ratio, SEARCH_FIELD_WEIGHTS["name"])
+    np.maximum(scores, field_scores(q_norm, emails, fuzz.partial_ratio, SEARCH_FIELD_WEIGHTS["email"]), out=scores)
+    q_digits = phone_digits(q)
+    if len(q_digits) >= 3:
+        np.maximum(scores, field_scores(q_digits, phones, fuzz.partial_ratio, SEARCH_FIELD_WEIGHTS["phone"]), out=scores)
+
+    matched = np.flatnonzero(scores > SEARCH_MIN_SCORE)
+    total = len(matched)
+    if k < total:
+        # Top-k without sorting every match: all above the k-th best score, then ties in name order
+        matched_scores = scores[matched]
+        kth = np.partition(matched_scores, total - k)[total - k]
+        above = matched[matched_scores > kth]
+        tied = matched[matched_scores == kth][:k - len(above)]
+        matched = np.concatenate([above, tied])
+    # Highest score first; equal scores keep name order
+    matched = matched[np.lexsort((matched, -scores[matched]))]
+    return [(ordered[i], round(float(scores[i]), 1)) for i in matched], total
+
+
+class SearchIndex:
+    """LRU cache of per-user indexes bounded by user count and memory"""
+
+    def __init__(self, max_users: int = SEARCH_INDEX_MAX_USERS,
+                 max_bytes: int = SEARCH_INDEX_MAX_BYTES,
+                 ttl_seconds: float = SEARCH_INDEX_TTL_SECONDS):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.nbytes = 0
+        self._users: "OrderedDict[int, UserIndex]" = OrderedDict()
+        # user_id -> number of writes seen while a load for that user is in flight
+        self._loading: Dict[int, int] = {}
+        self._lock = threading.RLock()
+
+    def get(self, user_id: int, data_version: Optional[int] = None) -> Optional[UserIndex]:
+        """Return the user's cached index, or None if it is not loaded
+
+        Pass the user's current users.data_version: an index built at an older
+        version missed writes made through other workers and is dropped. The
+        version only grows, so one read from a replica that is further behind
+        than the index keeps it.
+        """
+        with self._lock:
+            user_index = self._users.get(user_id)
+            if user_index is None:
+                return None
+            if time.monotonic() - user_index.loaded_at >= self.ttl_seconds or (
+                data_version is not None and (user_index.data_version is None or user_index.data_version < data_version)
+            ):
+                self._drop(user_id)
+                return None
+            self._users.move_to_end(user_id)
+            return user_index
+
+    def get_or_load(self, user_id: int, loader: Callable[[], Iterable], data_version: Optional[int] = None) -> UserIndex:
+        """Return the user's index, building it with ``loader`` on a miss
+
+        ``data_version`` is checked as in get() and recorded on a new index;
+        ``loader`` must read the contacts in the same transaction it was read in.
+        """
+        with self._lock:
+            user_index = self.get(user_id, data_version)
+            if user_index is not None:
+                return user_index
+            self._loading.setdefault(user_id, 0)
+            writes_before = self._loading[user_id]
+
+        # Load outside the lock so other users' searches are not blocked
+        try:
+            user_index = UserIndex(loader(), data_version)
+        except Exception:
+            with self._lock:
+                self._finish_load(user_id)
+            raise
+
+        with self._lock:
+            raced = self._loading.get(user_id, 0) != writes_before
+            self._finish_load(user_id)
+            # A write landed mid-load or the user alone exceeds the cap:
+            # serve this request from the fresh copy without caching it
+            if raced or user_id in self._users or user_index.nbytes > self.max_bytes:
+                return self._users.get(user_id, user_index)
+            self._users[user_id] = user_index
+            self.nbytes += user_index.nbytes
+            self._evict()
+        return user_index
+
+    def upsert(self, contact, data_version: Optional[int]) -> None:
+        """Apply a created or updated contact to its owner's index
+
+        ``data_version`` is the users.data_version the write committed, as
+        returned by crud._touch_user.
+        """
+        with self._lock:
+            self._note_write(contact.user_id)
+            user_index = self._current_for_write(contact.user_id, data_version)
+            if user_index is not None:
+                self.nbytes += user_index.upsert(contact)
+                self._evict()
+
+    def remove(self, user_id: int, contact_id: int, data_version: Optional[int]) -> None:
+        """Remove a deleted contact from its owner's index; ``data_version`` as in upsert()"""
+        with self._lock:
+            self._note_write(user_id)
+            user_index = self._current_for_write(user_id, data_version)
+            if user_index is not None:
+                self.nbytes += user_index.remove(contact_id)
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget a user's index so the next search reloads it"""
+        with self._lock:
+            self._note_write(user_id)
+            self._drop(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+            self.nbytes = 0
+
+    def _current_for_write(self, user_id: int, data_version: Optional[int]) -> Optional[UserIndex]:
+        """The user's index if it sits just before the write at ``data_version``, else drop it
+
+        An index a search reloaded after the write committed, or one that missed
+        other writes in between, cannot be given a version matching its contents.
+        """
+        user_index = self._users.get(user_id)
+        if user_index is None:
+            return None
+        if data_version is None or user_index.data_version is None or user_index.data_version != data_version - 1:
+            self._drop(user_id)
+            return None
+        user_index.data_version = data_version
+        return user_index
+
+    def _note_write(self, user_id: int) -> None:
+        if user_id in self._loading:
+            self._loading[user_id] += 1
+
+    def _finish_load(self, user_id: int) -> None:
+        self._loading.pop(user_id, None)
+
+    def _drop(self, user_id: int) -> None:
+        user_index = self._users.pop(user_id, None)
+        if user_index is not None:
+            self.nbytes -= user_index.nbytes
+
+    def _evict(self) -> None:
+        # Always keep the most recently used user
+        while len(self._users) > 1 and (
+            len(self._users) > self.max_users or self.nbytes > self.max_bytes
+        ):
+            _, user_index = self._users.popitem(last=False)
+            self.nbytes -= user_index.nbytes
+
+
+# Shared by all requests in this worker
+index = SearchIndex()
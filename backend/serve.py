@@ -0,0 +1,103 @@
+"""Production server: several uvicorn worker processes sharing one listening socket.
+
+    python serve.py
+
+`python main.py` remains the single-process development server with reload.
+
+Signals to the parent process:
+    SIGHUP   replace the workers one at a time, each after its replacement is
+             ready, so deploys and config reloads drop no connections
+    SIGTTIN  add a worker; SIGTTOU removes one
+    SIGTERM  stop accepting, finish in-flight requests (up to
+             SERVER_GRACEFUL_TIMEOUT seconds) and exit
+
+Workers do not create tables; set CREATE_TABLES_ON_STARTUP=1 to have the
+parent create missing ones before they start. The worker count is exported
+as WEB_CONCURRENCY, which database.py uses to split DB_MAX_CONNECTIONS
+between the workers' connection pools.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def default_workers() -> int:
+    """One worker per CPU this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+PORT = int(os.getenv("SERVER_PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or default_workers())
+# Idle keep-alive connections are closed after this many seconds; keep it above the proxy's idle timeout
+SERVER_KEEP_ALIVE_SECONDS = int(os.getenv("SERVER_KEEP_ALIVE_SECONDS", "75"))
+# Pending connections the kernel queues while every worker is busy
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+# In-flight requests per worker before new ones get a 503; 0 means no limit
+SERVER_LIMIT_CONCURRENCY = int(os.getenv("SERVER_LIMIT_CONCURRENCY", "0"))
+# Requests after which a worker is recycled, bounding growth of per-process caches; 0 disables it
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS", "50000"))
+# Spreads recycling out so workers do not restart together
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "5000"))
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+# Proxies whose X-Forwarded-For / X-Forwarded-Proto headers are trusted
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+
+def prepare_metrics_dir():
+    """Give the workers a fresh shared directory for Prometheus multiprocess metrics"""
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "phonebook_metrics")
+    # Files left by a previous run would be summed into this one's counters
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+
+def main():
+    import uvicorn
+
+    # Inherited by the worker processes, which import database.py after this point
+    os.environ["WEB_CONCURRENCY"] = str(WEB_CONCURRENCY)
+    try:
+        # Checks the connection budget here rather than in every worker as it starts
+        import database
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    prepare_metrics_dir()
+    if os.getenv("CREATE_TABLES_ON_STARTUP") == "1":
+        # Done once here; workers doing it concurrently race on CREATE TABLE
+        import models
+        models.Base.metadata.create_all(bind=database.engine)
+        database.engine.dispose()
+        os.environ["CREATE_TABLES_ON_STARTUP"] = "0"
+    print(f"[INFO] Starting {WEB_CONCURRENCY} worker(s) on {HOST}:{PORT}")
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        backlog=SERVER_BACKLOG,
+        timeout_keep_alive=SERVER_KEEP_ALIVE_SECONDS,
+        limit_concurrency=SERVER_LIMIT_CONCURRENCY or None,
+        limit_max_requests=SERVER_MAX_REQUESTS or None,
+        limit_max_requests_jitter=SERVER_MAX_REQUESTS_JITTER if SERVER_MAX_REQUESTS else 0,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        server_header=False,
+        log_level=LOG_LEVEL,
+    )
+
+
+if __name__ == "__main__":
+    main()
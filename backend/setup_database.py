@@ -37,7 +37,8 @@ try:
     cnx.close()
 
     print("\n[SUCCESS] Database setup complete!")
-    print(f"You can now run the application with: python main.py")
+    print("Create the tables with: python migrate.py up")
+    print("Then run the application with: python main.py")
 
 except mysql.connector.Error as err:
     if err.errno == errorcode.ER_ACCESS_DENIED_ERROR:
@@ -0,0 +1,127 @@
+import os
+import sys
+import tempfile
+
+# Run against a throwaway SQLite database so no server is needed
+DB_FILE = os.path.join(tempfile.mkdtemp(), "verify_writes.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+
+from fastapi import HTTPException
+from sqlalchemy import event, select
+
+import crud
+import models
+import schemas
+from database import SessionLocal, engine
+
+# Statements each write may issue on a backend without FULLTEXT (contact_ngrams
+# maintenance adds one INSERT on create and a DELETE + INSERT on renames; deletes
+# leave the trigrams to ON DELETE CASCADE)
+EXPECTED = {
+    "create": 3,            # INSERT contact, INSERT ngrams, UPDATE users counter/version
+    "create duplicate": 1,  # INSERT rejected by uq_user_phone
+    "update address": 3,    # SELECT contact, UPDATE contact, UPDATE users version
+    "update name": 5,       # SELECT, UPDATE, DELETE + INSERT ngrams, UPDATE users
+    "update duplicate": 2,  # SELECT, UPDATE rejected by uq_user_phone
+    "delete": 2,            # DELETE contact (cascades to ngrams), UPDATE users counter/version
+    "delete missing": 1,    # DELETE matching no rows
+    "batch delete": 3,      # SELECT ... FOR UPDATE, DELETE contacts (cascades), UPDATE users
+    "merge": 3,             # SELECT ... FOR UPDATE, DELETE duplicates (cascades), UPDATE users
+}
+
+statements = []
+# contact_ngrams DELETEs seen across all writes, for the query-plan check
+ngram_deletes = []
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+    if statement.lstrip().upper().startswith("DELETE FROM CONTACT_NGRAMS"):
+        ngram_deletes.append((statement, parameters))
+
+def measure(label, fn):
+    statements.clear()
+    try:
+        fn()
+    except HTTPException as e:
+        if e.status_code != 400:
+            raise
+    count = len(statements)
+    ok = count == EXPECTED[label]
+    print(f"[{'SUCCESS' if ok else 'ERROR'}] {label}: {count} statement(s), expected {EXPECTED[label]}")
+    if not ok:
+        for statement in statements:
+            print(f"    {statement}")
+    return ok
+
+def check_ngram_plans(db):
+    """Trigram cleanup must use the (contact_id, gram) primary key, not scan all of a user's trigrams"""
+    ok = True
+    left = db.query(models.ContactNgram).filter(
+        models.ContactNgram.contact_id.notin_(select(models.Contact.id))
+    ).count()
+    if left:
+        print(f"[ERROR] deletes left {left} trigram row(s) behind; is PRAGMA foreign_keys on?")
+        ok = False
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for statement, parameters in ngram_deletes:
+            plan = " | ".join(row[-1] for row in cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            if "ix_contact_ngrams_user_gram" in plan or "SCAN" in plan:
+                print(f"[ERROR] trigram DELETE does not use the primary key: {plan}")
+                print(f"    {statement}")
+                ok = False
+    finally:
+        connection.close()
+    if ok:
+        print(f"[SUCCESS] trigram cleanup: {len(ngram_deletes)} DELETE(s) planned on the primary key, cascade applied")
+    return ok
+
+def verify_write_statements():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = models.User(email="verify@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+
+        # Plain ids: rollbacks expire ORM objects and reading them would add SELECTs
+        user_id = user.id
+        first_id = crud.create_contact(db, schemas.ContactCreate(name="First", phone="1111111111"), user_id).id
+
+        results = [
+            measure("create", lambda: crud.create_contact(
+                db, schemas.ContactCreate(name="Second", phone="2222222222"), user_id)),
+            measure("create duplicate", lambda: crud.create_contact(
+                db, schemas.ContactCreate(name="Copy", phone="1111111111"), user_id)),
+            measure("update address", lambda: crud.update_contact(
+                db, first_id, schemas.ContactUpdate(address="1 Main St"), user_id)),
+            measure("update name", lambda: crud.update_contact(
+                db, first_id, schemas.ContactUpdate(name="Renamed"), user_id)),
+            measure("update duplicate", lambda: crud.update_contact(
+                db, first_id, schemas.ContactUpdate(phone="2222222222"), user_id)),
+            measure("delete", lambda: crud.delete_contact(db, first_id, user_id)),
+            measure("delete missing", lambda: crud.delete_contact(db, first_id, user_id)),
+        ]
+        batch_ids = [
+            crud.create_contact(db, schemas.ContactCreate(name=f"Batch {i}", phone=f"333333333{i}"), user_id).id
+            for i in range(2)
+        ]
+        results.append(measure("batch delete", lambda: crud.delete_contacts(
+            db, user_id, schemas.ContactBatchSelection(ids=batch_ids))))
+        merge_ids = [
+            crud.create_contact(db, schemas.ContactCreate(name=f"Merge {i}", phone=f"444444444{i}"), user_id).id
+            for i in range(2)
+        ]
+        results.append(measure("merge", lambda: crud.merge_contacts(
+            db, user_id, [schemas.MergeCluster(primary_id=merge_ids[0], duplicate_ids=merge_ids[1:])])))
+        results.append(check_ngram_plans(db))
+        return all(results)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    success = verify_write_statements()
+    if not success:
+        sys.exit(1)